@@ -0,0 +1,212 @@
+"""
+Times the wave-timeline analytics on a large number of synthetic games and
+checks them against a plain Python loop over the same games as GameRecords.
+
+Events for the large run are generated straight into NumPy arrays, since
+building that many game dicts would take longer than the analytics.
+
+    python benchmarks/bench_analytics.py --games 100000 --check 2000
+"""
+import argparse, collections, os, sys, time
+
+import numpy as np
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+import analytics
+from analytics import Events, Timeline
+from synthetic import TOWERS, BUILDERS
+
+WAVES = 50
+
+
+def generate(games: int, seed: int) -> dict:
+    """Flat event arrays for `games` eight player games ending between waves 15 and 50."""
+    rng = np.random.default_rng(seed)
+    end_wave = rng.integers(15, WAVES + 1, games, dtype=np.int16)
+    winner = rng.integers(0, 2, games, dtype=np.int8)
+    players = Events(np.repeat(np.arange(games, dtype=np.int32), 8), np.tile(np.arange(8, dtype=np.int8), games),
+                     None)
+    team = players.slot % 2
+    won = team == winner[players.game]
+
+    def events(per_player_wave: float, codes: int = 0) -> Events:
+        # Compact dtypes; at 100k games there are around a hundred million tower events.
+        count = rng.poisson(per_player_wave * 8 * (end_wave + 1))
+        game = np.repeat(np.arange(games, dtype=np.int32), count)
+        wave = (rng.random(len(game), dtype=np.float32) * (end_wave[game] + 1)).astype(np.int16)
+        slot = rng.integers(0, 8, len(game), dtype=np.int8)
+        code = rng.integers(0, codes, len(game), dtype=np.int16) if codes else None
+        return Events(game, slot, wave, code)
+
+    # A builder on wave 0 for everyone, then the odd swap.
+    builders = Events(players.game, players.slot, np.zeros(len(players.game), dtype=np.int16),
+                      rng.integers(0, len(BUILDERS), len(players.game), dtype=np.int16))
+    swaps = events(0.02, len(BUILDERS))
+    builders = Events(*(np.concatenate(pair) for pair in zip(builders, swaps)))
+    return {
+        "game_ids": np.arange(games) + 1000000, "end_wave": end_wave, "players": players, "won": won,
+        "team": team, "workers": events(0.3), "upgrades": events(0.1), "sends": events(1),
+        "towers": events(4, len(TOWERS)), "builders": builders,
+        "tower_names": TOWERS, "builder_names": BUILDERS,
+    }
+
+
+def records(data: dict, games: int) -> list:
+    """The first `games` games of generate() output as GameRecords."""
+    result = [{"id": int(data["game_ids"][g]), "patch": "8.14", "creeps": "1x", "gamemode": "Chaos",
+               "end_wave": int(data["end_wave"][g]), "players": [], "towers": [], "sends": [],
+               "buildersByWave": [], "workers": [], "upgrades": []} for g in range(games)]
+    players = data["players"]
+    for g, slot, won, team in zip(players.game[:8 * games], players.slot, data["won"], data["team"]):
+        result[g]["players"].append({"name": f"Player{slot + 1}", "handle": f"h{slot}", "user_id": int(slot),
+                                     "player_id": int(slot) + 1, "color": (0, 0, 0),
+                                     "team": analytics.TEAMS[team], "won": bool(won)})
+    for key, field in (("workers", "workers"), ("upgrades", "upgrades"), ("sends", "sends"),
+                       ("towers", "towers"), ("builders", "buildersByWave")):
+        events = data[key]
+        keep = events.game < games
+        codes = events.code[keep] if events.code is not None else np.zeros(keep.sum(), dtype=np.int16)
+        for g, slot, wave, code in zip(events.game[keep], events.slot[keep], events.wave[keep], codes):
+            if key == "towers":
+                row = {"builder": int(slot) + 1, "type": TOWERS[code], "wave": int(wave), "posx": 0, "posy": 0}
+            elif key == "builders":
+                row = {"player": int(slot) + 1, "type": BUILDERS[code], "wave": int(wave)}
+            elif key == "sends":
+                row = {"player": int(slot) + 1, "type": "Send_Zergling", "wave": int(wave)}
+            else:
+                row = {"player": int(slot) + 1, "wave": int(wave), "number": 0}
+            result[g][field].append(row)
+    for game in result:
+        game["buildersByWave"].sort(key=lambda b: b["wave"])
+    return result
+
+
+def reference(games: list, waves: int, tower_values: dict) -> dict:
+    """The same figures as analytics.py, one game and player at a time."""
+    def by_outcome(per_wave):
+        sums = {name: [0.0] * waves for name in ("all", "winners", "losers")}
+        counts = {name: [0] * waves for name in sums}
+        for game in games:
+            for player in game["players"]:
+                values = per_wave(game, player["player_id"])
+                outcome = "winners" if player["won"] else "losers"
+                for wave in range(min(game["end_wave"] + 1, waves)):
+                    for name in ("all", outcome):
+                        sums[name][wave] += values[wave]
+                        counts[name][wave] += 1
+        return {name: [s / c if c else 0.0 for s, c in zip(sums[name], counts[name])] for name in sums}
+
+    def cumulative(field):
+        def per_wave(game, pid):
+            values = [0] * waves
+            for row in game[field]:
+                if row["player"] == pid:
+                    values[row["wave"]] += 1
+            for wave in range(1, waves):
+                values[wave] += values[wave - 1]
+            return values
+        return per_wave
+
+    def tower_value(game, pid):
+        values = [0.0] * waves
+        for tower in game["towers"]:
+            if tower["builder"] == pid:
+                values[tower["wave"]] += tower_values.get(tower["type"], 0.0)
+        return values
+
+    pressure = {name: [0.0] * waves for name in ("winners", "losers")}
+    alive = [0] * waves
+    for game in games:
+        won = {player["player_id"]: player["won"] for player in game["players"]}
+        for wave in range(min(game["end_wave"] + 1, waves)):
+            alive[wave] += 1
+        for send in game["sends"]:
+            if send["player"] in won and send["wave"] <= game["end_wave"]:
+                pressure["winners" if won[send["player"]] else "losers"][send["wave"]] += 1
+
+    builders = collections.Counter()
+    wins = collections.Counter()
+    for game in games:
+        for player in game["players"]:
+            picks = [b for b in game["buildersByWave"] if b["player"] == player["player_id"]]
+            if picks:
+                first = min(picks, key=lambda b: b["wave"])["type"]
+                builders[first] += 1
+                wins[first] += player["won"]
+
+    return {
+        "workers": by_outcome(cumulative("workers")),
+        "upgrades": by_outcome(cumulative("upgrades")),
+        "tower_value": by_outcome(tower_value),
+        "send_pressure": {name: [s / a if a else 0.0 for s, a in zip(pressure[name], alive)] for name in pressure},
+        "builders": {name: (builders[name], wins[name]) for name in builders},
+    }
+
+
+def vectorized(timeline: Timeline) -> dict:
+    economy = analytics.economy_curve(timeline)
+    return {
+        "workers": economy["workers"],
+        "upgrades": economy["upgrades"],
+        "tower_value": analytics.tower_value_curve(timeline),
+        "send_pressure": analytics.send_pressure(timeline),
+        "builders": {name: (games, wins) for name, games, wins, _rate in analytics.builder_win_rates(timeline)},
+    }
+
+
+def same(expected: dict, actual: dict) -> bool:
+    for key, value in expected.items():
+        if key == "builders":
+            if value != actual[key]:
+                return False
+            continue
+        for name, curve in value.items():
+            if not np.allclose(curve, actual[key][name][:len(curve)], rtol=1e-5):
+                return False
+    return True
+
+
+def timed(run) -> tuple:
+    start = time.perf_counter()
+    value = run()
+    return value, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NumPy wave-timeline analytics.")
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--check", type=int, default=2000, help="Games compared against the Python loop.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    tower_values = {name: 50.0 + 25 * i for i, name in enumerate(TOWERS)}
+
+    data, seconds = timed(lambda: generate(args.games, args.seed))
+    print(f"generated {args.games} games in {seconds:.2f}s")
+
+    timeline, load = timed(lambda: Timeline.from_events(**data, tower_values=tower_values))
+    print(f"from_events: {load:.2f}s, arrays {timeline.shape}, "
+          f"{sum(a.nbytes for a in vars(timeline).values() if isinstance(a, np.ndarray)) / 2 ** 20:.0f}MB")
+    for name, run in (("economy_curve", analytics.economy_curve),
+                      ("tower_value_curve", analytics.tower_value_curve),
+                      ("send_pressure", analytics.send_pressure),
+                      ("builder_win_rates", analytics.builder_win_rates)):
+        _, seconds = timed(lambda: run(timeline))
+        print(f"{name}: {seconds:.3f}s ({args.games / seconds:,.0f} games/s)")
+    _, total = timed(lambda: vectorized(timeline))
+    print(f"all analytics: {total:.2f}s")
+
+    games = records(data, min(args.check, args.games))
+    expected, loop = timed(lambda: reference(games, WAVES + 1, tower_values))
+    actual, fast = timed(lambda: vectorized(analytics.load_games(games, tower_values)))
+    print(f"{len(games)} games: python loop {loop:.2f}s, load_games + analytics {fast:.2f}s, "
+          f"loop extrapolated to {args.games} games {loop * args.games / len(games):.1f}s")
+    if not same(expected, actual):
+        sys.exit("analytics do not match the Python loop")
+    print("results match the Python loop")
+
+
+if __name__ == "__main__":
+    main()
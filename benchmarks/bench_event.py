@@ -0,0 +1,118 @@
+"""
+Microbenchmark for event.Event against the previous dict subclass that
+decoded every bytes value up front.
+
+Reports events per second for wrapping a tracker-shaped stream and reading
+the fields Replay.read() uses, and the bytes each retained event costs.
+
+    python benchmarks/bench_event.py --events 200000
+"""
+import argparse, os, random, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from event import Event
+
+
+class LegacyEvent(dict):
+    """The dict-based Event this benchmark measures against."""
+
+    def __init__(self, *args, **kwargs):
+        super(LegacyEvent, self).__init__(*args, **kwargs)
+        self._event = self.get('_event')
+        for key, value in self.items():
+            if isinstance(value, bytes):
+                self[key] = value.decode(encoding='utf-8')
+
+    @property
+    def unit_born(self) -> bool:
+        return self._event == 'NNet.Replay.Tracker.SUnitBornEvent'
+
+    @property
+    def unit_init(self) -> bool:
+        return self._event == 'NNet.Replay.Tracker.SUnitInitEvent'
+
+    @property
+    def unit_died(self) -> bool:
+        return self._event == 'NNet.Replay.Tracker.SUnitDiedEvent'
+
+    @property
+    def upgrade_event(self) -> bool:
+        return self._event == 'NNet.Replay.Tracker.SUpgradeEvent'
+
+
+def stats_event(rng: random.Random, loop: int) -> dict:
+    stats = {f"m_score{i}": rng.randint(0, 5000) for i in range(39)}
+    return {"_event": "NNet.Replay.Tracker.SPlayerStatsEvent", "_eventid": 0, "_gameloop": loop,
+            "m_playerId": rng.randint(1, 8), "m_stats": stats}
+
+
+def unit_event(rng: random.Random, loop: int, kind: str, eventid: int) -> dict:
+    return {"_event": kind, "_eventid": eventid, "_gameloop": loop,
+            "m_unitTagIndex": rng.randint(0, 4000), "m_unitTagRecycle": rng.randint(1, 50),
+            "m_unitTypeName": rng.choice([b"fMarine", b"Wave12", b"Send_Zergling", b"SquadronWorker"]),
+            "m_controlPlayerId": rng.randint(1, 8), "m_upkeepPlayerId": rng.randint(1, 8),
+            "m_x": rng.randint(0, 200), "m_y": rng.randint(0, 200),
+            "m_creatorAbilityName": b"BuildTower", "m_creatorUnitTagIndex": None,
+            "m_creatorUnitTagRecycle": None}
+
+
+def stream(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    events = []
+    for loop in range(count):
+        roll = rng.random()
+        if roll < 0.3:
+            events.append(stats_event(rng, loop))
+        elif roll < 0.6:
+            events.append(unit_event(rng, loop, "NNet.Replay.Tracker.SUnitBornEvent", 1))
+        elif roll < 0.8:
+            events.append(unit_event(rng, loop, "NNet.Replay.Tracker.SUnitInitEvent", 6))
+        else:
+            events.append({"_event": "NNet.Replay.Tracker.SUnitDiedEvent", "_eventid": 2, "_gameloop": loop,
+                           "m_unitTagIndex": rng.randint(0, 4000), "m_unitTagRecycle": rng.randint(1, 50),
+                           "m_killerPlayerId": rng.randint(1, 8), "m_x": 10, "m_y": 10})
+    return events
+
+
+def consume(cls, raw: list) -> float:
+    """Wraps every event and touches what Replay.read() touches. Returns seconds."""
+    start = time.perf_counter()
+    for data in raw:
+        event = cls(data) if cls is Event else cls(**data)
+        if event.unit_init or event.unit_born:
+            event['m_unitTypeName']
+            event['m_controlPlayerId']
+        if event.upgrade_event:
+            event['m_upgradeTypeName']
+        if event.unit_died:
+            event.get('m_killerPlayerId')
+    return time.perf_counter() - start
+
+
+def retained_bytes(cls, raw: list) -> float:
+    """Average traced bytes per event for a list of wrapped events, including the decoded dicts."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    events = [cls(dict(data)) if cls is Event else cls(**data) for data in raw]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del events
+    return (after - before) / len(raw)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Event against the legacy dict subclass.")
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    for name, cls in (("LegacyEvent", LegacyEvent), ("Event", Event)):
+        # Event decodes in place, so every run gets a fresh copy of the stream.
+        seconds = consume(cls, stream(args.events, args.seed))
+        size = retained_bytes(cls, stream(min(args.events, 50000), args.seed))
+        print(f"{name:12} {args.events / seconds:12.0f} events/s  {size:8.0f} bytes/event")
+
+
+if __name__ == "__main__":
+    main()
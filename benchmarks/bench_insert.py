@@ -0,0 +1,57 @@
+"""
+Compares the row-at-a-time insert_game() path with BulkWriter on synthetic
+game dicts written to a fresh SQLite database.
+
+    python benchmarks/bench_insert.py --games 2000 --commit-interval 200
+"""
+import argparse, os, sqlite3, sys, tempfile, time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+from writer import BulkWriter, insert_game
+import schema
+from synthetic import SyntheticGame
+
+
+def connect(directory: str, name: str) -> sqlite3.Connection:
+    db = sqlite3.connect(os.path.join(directory, name))
+    schema.upgrade(db)
+    return db
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark insert_game() against BulkWriter.")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--commit-interval", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    game = SyntheticGame(waves=25, towers=1, sends=1, seed=args.seed)
+    # game_dict() samples its players from the pool, so it needs at least that many handles.
+    handles = [f"1-S2-1-{i}" for i in range(max(args.games, game.players))]
+    games = [game.game_dict(1000000 + i, handles) for i in range(args.games)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = connect(directory, "rows.db")
+        start = time.perf_counter()
+        for game in games:
+            insert_game(db, game)
+        rows = time.perf_counter() - start
+        db.close()
+
+        db = connect(directory, "bulk.db")
+        start = time.perf_counter()
+        with BulkWriter(db, args.commit_interval) as writer:
+            for game in games:
+                writer.add(game)
+        bulk = time.perf_counter() - start
+        db.close()
+
+    print(f"insert_game  {rows:8.3f}s  {args.games / rows:10.1f} games/s")
+    print(f"BulkWriter   {bulk:8.3f}s  {args.games / bulk:10.1f} games/s  (commit every {args.commit_interval})")
+    print(f"speedup      {rows / bulk:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
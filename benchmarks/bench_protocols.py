@@ -0,0 +1,73 @@
+"""
+Differential check and timing for ProtocolRegistry against the regex
+closest_version() lookup it replaces, plus the cost of importing a protocol
+module cold versus from the registry.
+
+Needs s2protocol installed.
+
+    python benchmarks/bench_protocols.py --lookups 2000
+"""
+import argparse, importlib, os, random, re, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from protocols import ProtocolRegistry
+
+
+def closest_version(n, versions) -> (int, int):
+    """The lookup Replay.__init__ used to run for every replay of an unknown build."""
+    seq = list(map(int, re.findall('\\d+', ''.join(versions.list_all()))))
+    lst = sorted(seq + [n])
+    min_index = lst.index(n) - 1
+    max_index = min(min_index + 2, len(lst) - 1)
+    return seq[min_index], lst[max_index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ProtocolRegistry against closest_version().")
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    from s2protocol import versions
+    registry = ProtocolRegistry(versions)
+    builds = registry.builds
+    known = set(builds)
+
+    rng = random.Random(args.seed)
+    missing = [n for n in (rng.randint(builds[0], builds[-1]) for _ in range(args.lookups * 4)) if n not in known]
+    missing = missing[:args.lookups]
+
+    for n in missing:
+        if closest_version(n, versions)[0] != registry.closest(n):
+            raise AssertionError(f"build {n}: closest_version and ProtocolRegistry disagree")
+
+    start = time.perf_counter()
+    for n in missing:
+        closest_version(n, versions)
+    regex = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for n in missing:
+        registry.closest(n)
+    bisect = time.perf_counter() - start
+
+    # A build nothing has imported yet, so the first lookup pays for the import.
+    build = builds[len(builds) // 2]
+    sys.modules.pop(f"protocol{build:05d}", None)
+    importlib.invalidate_caches()
+    start = time.perf_counter()
+    registry.module(build)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    registry.module(build)
+    warm = time.perf_counter() - start
+
+    print(f"{len(builds)} protocol builds, {len(missing)} lookups of missing builds, results identical")
+    print(f"closest_version  {regex / len(missing) * 1e6:10.2f} us/lookup")
+    print(f"registry bisect  {bisect / len(missing) * 1e6:10.2f} us/lookup  ({regex / bisect:.0f}x)")
+    print(f"protocol{build:05d} import {cold * 1000:8.2f} ms cold, {warm * 1e6:.2f} us from the registry")
+
+
+if __name__ == "__main__":
+    main()
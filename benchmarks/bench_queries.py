@@ -0,0 +1,123 @@
+"""
+Times the per-player stats queries against a generated database, once in the
+original layout (type names as text, no secondary indexes) and once in the
+current schema, and checks that both layouts return the same rows.
+
+    python benchmarks/bench_queries.py --games 1600 --queries 20
+"""
+import argparse, os, random, sqlite3, sys, tempfile, time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+from writer import BulkWriter
+from synthetic import SyntheticGame
+import schema
+
+
+PATCHES = ["8.12", "8.13", "8.14", "8.15"]
+
+# name: (original layout, current schema); each takes (handle, patch, game_id)
+QUERIES = {
+    "tower picks by handle and patch": (
+        """SELECT t.TOWER_TYPE, COUNT(*) FROM Towers t JOIN Games g ON g.ID = t.GAME_ID
+           WHERE t.HANDLE = :handle AND g.PATCH = :patch GROUP BY t.TOWER_TYPE""",
+        """SELECT tt.NAME, COUNT(*) FROM Towers t JOIN Games g ON g.ID = t.GAME_ID
+           JOIN TowerTypes tt ON tt.ID = t.TOWER_TYPE_ID
+           WHERE t.HANDLE = :handle AND g.PATCH = :patch GROUP BY tt.NAME""",
+    ),
+    "win rate by builder": (
+        """SELECT b.BUILDER, SUM(gp.WON), COUNT(*) FROM Builders b
+           JOIN GamePlayers gp ON gp.GAME_ID = b.GAME_ID AND gp.PLAYER_HANDLE = b.HANDLE
+           WHERE b.HANDLE = :handle AND b.WAVE = 0 GROUP BY b.BUILDER""",
+        """SELECT bt.NAME, SUM(gp.WON), COUNT(*) FROM Builders b
+           JOIN GamePlayers gp ON gp.GAME_ID = b.GAME_ID AND gp.PLAYER_HANDLE = b.HANDLE
+           JOIN BuilderTypes bt ON bt.ID = b.BUILDER_ID
+           WHERE b.HANDLE = :handle AND b.WAVE = 0 GROUP BY bt.NAME""",
+    ),
+    "match history": (
+        """SELECT g.ID, g.PATCH, gp.WON FROM GamePlayers gp JOIN Games g ON g.ID = gp.GAME_ID
+           WHERE gp.PLAYER_HANDLE = :handle ORDER BY g.ID DESC LIMIT 20""",
+        """SELECT g.ID, g.PATCH, gp.WON FROM GamePlayers gp JOIN Games g ON g.ID = gp.GAME_ID
+           WHERE gp.PLAYER_HANDLE = :handle ORDER BY g.ID DESC LIMIT 20""",
+    ),
+    "towers of one game": (
+        "SELECT WAVE, TOWER_TYPE, HANDLE, PLAYER_ID FROM Towers WHERE GAME_ID = :game_id",
+        "SELECT WAVE, TOWER_TYPE, HANDLE, PLAYER_ID FROM TowersNamed WHERE GAME_ID = :game_id",
+    ),
+}
+
+# The tables as they were before indexes and type interning.
+ORIGINAL_TABLES = {
+    "Games": "SELECT * FROM main.Games",
+    "GamePlayers": "SELECT * FROM main.GamePlayers",
+    "Towers": "SELECT * FROM main.TowersNamed",
+    "Builders": "SELECT * FROM main.BuildersNamed",
+}
+
+
+def generate(path: str, games: int, players: int, seed: int) -> sqlite3.Connection:
+    db = sqlite3.connect(path)
+    schema.configure(db)
+    schema.upgrade(db)
+    game = SyntheticGame(seed=seed)
+    handles = [f"1-S2-1-{i}" for i in range(players)]
+    with BulkWriter(db, commit_interval=200) as writer:
+        for i in range(games):
+            data = game.game_dict(1000000 + i, handles)
+            data['patch'] = PATCHES[i * len(PATCHES) // games]
+            writer.add(data)
+    return db
+
+
+def copy_original(db: sqlite3.Connection, path: str) -> sqlite3.Connection:
+    db.execute("ATTACH DATABASE ? AS original", (path,))
+    with db:
+        for table, select in ORIGINAL_TABLES.items():
+            db.execute(f"CREATE TABLE original.{table} AS {select}")
+    db.execute("DETACH DATABASE original")
+    return sqlite3.connect(path)
+
+
+def time_query(db: sqlite3.Connection, sql: str, params: list) -> tuple:
+    results = []
+    start = time.perf_counter()
+    for p in params:
+        results.append(sorted(db.execute(sql, p).fetchall()))
+    return (time.perf_counter() - start) / len(params), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark stats queries on the original and indexed schema.")
+    parser.add_argument("--games", type=int, default=1600, help="1600 games is about a million tower rows.")
+    parser.add_argument("--players", type=int, default=2000, help="Distinct handles to draw players from.")
+    parser.add_argument("--queries", type=int, default=20, help="Parameter sets to time per query.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        current = generate(os.path.join(directory, "current.db"), args.games, args.players, args.seed)
+        original = copy_original(current, os.path.join(directory, "original.db"))
+        towers = current.execute("SELECT COUNT(*) FROM Towers").fetchone()[0]
+        print(f"generated {args.games} games, {towers} tower rows in {time.perf_counter() - start:.1f}s")
+
+        rng = random.Random(args.seed)
+        players = [row[0] for row in current.execute("SELECT DISTINCT PLAYER_HANDLE FROM GamePlayers")]
+        params = [{"handle": rng.choice(players), "patch": rng.choice(PATCHES),
+                   "game_id": 1000000 + rng.randrange(args.games)} for _ in range(args.queries)]
+
+        print(f"{'query':34} {'original':>12} {'indexed':>12} {'speedup':>9}")
+        for name, (before, after) in QUERIES.items():
+            slow, expected = time_query(original, before, params)
+            fast, actual = time_query(current, after, params)
+            if actual != expected:
+                raise AssertionError(f"{name}: layouts returned different rows")
+            print(f"{name:34} {slow * 1000:9.2f} ms {fast * 1000:9.2f} ms {slow / fast:8.1f}x")
+
+        original.close()
+        current.close()
+
+
+if __name__ == "__main__":
+    main()
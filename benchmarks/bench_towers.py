@@ -0,0 +1,82 @@
+"""
+Differential check and timing for TowerIndex against the linear
+tower_in_list() scan it replaces.
+
+Both are fed the same tower streams the way Replay.handle_unit() feeds them
+and must keep exactly the same towers, in the same order.
+
+    python benchmarks/bench_towers.py --games 50 --towers 2000
+"""
+import argparse, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from tracker import TowerIndex, tower_in_list
+
+
+def tower_stream(count: int, seed: int) -> list:
+    """Towers clustered on a small build area, with repeats and near-repeats like real games."""
+    rng = random.Random(seed)
+    types = [f"fTower{i}" for i in range(12)]
+    towers = []
+    wave = 0
+    for i in range(count):
+        if rng.random() < 0.02:
+            wave += 1
+        towers.append({
+            "builder": rng.randint(1, 8),
+            "type": rng.choice(types),
+            "wave": wave,
+            "posx": rng.randint(10, 30) + rng.choice([0, 0, 0, 0.5]),
+            "posy": rng.randint(10, 30)
+        })
+    return towers
+
+
+def dedupe_linear(stream: list) -> list:
+    towers = []
+    for tower in stream:
+        if not tower_in_list(towers, tower):
+            towers.append(tower)
+    return towers
+
+
+def dedupe_indexed(stream: list) -> list:
+    towers = []
+    index = TowerIndex()
+    for tower in stream:
+        if not index.near(tower):
+            towers.append(tower)
+            index.add(tower)
+    return towers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and time TowerIndex against tower_in_list.")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--towers", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    streams = [tower_stream(args.towers, args.seed + i) for i in range(args.games)]
+
+    linear = indexed = 0.0
+    for stream in streams:
+        start = time.perf_counter()
+        expected = dedupe_linear(stream)
+        linear += time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = dedupe_indexed(stream)
+        indexed += time.perf_counter() - start
+
+        if actual != expected:
+            sys.exit("TowerIndex kept different towers than tower_in_list.")
+
+    print(f"{args.games} streams of {args.towers} towers: results identical")
+    print(f"tower_in_list {linear:8.3f}s")
+    print(f"TowerIndex    {indexed:8.3f}s  ({linear / indexed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Times unit tracking and player lookup over a long-game tracker stream.
+
+Compares TrackedUnits with integer unit tags against the previous
+string-keyed version, and the indexed Replay.player() lookup against the
+previous linear scan over the player list.
+
+    python benchmarks/bench_tracker.py --units 200000
+"""
+import argparse, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from event import Event
+from tracker import TrackedUnits
+
+
+class LegacyTrackedUnits:
+    """The string-keyed TrackedUnits this benchmark measures against."""
+
+    def __init__(self):
+        self._tracked = {}
+
+    def add(self, event) -> None:
+        key = "{m_unitTagIndex}-{m_unitTagRecycle}".format(**event)
+        self._tracked[key] = event
+
+    def fetch(self, event, killer=False):
+        try:
+            if killer:
+                key = "{m_killerUnitTagIndex}-{m_killerUnitTagRecycle}".format(**event)
+            else:
+                key = "{m_unitTagIndex}-{m_unitTagRecycle}".format(**event)
+            return self._tracked.get(key)
+        except KeyError:
+            return
+
+
+def long_game(units: int, seed: int) -> list:
+    """Born events for `units` units, each followed later by its death, as read() sees them."""
+    rng = random.Random(seed)
+    events = []
+    alive = []
+    for i in range(units):
+        index, recycle = i % 4096, i // 4096 + 1
+        events.append(Event({"_event": "NNet.Replay.Tracker.SUnitBornEvent", "_gameloop": i,
+                             "m_unitTagIndex": index, "m_unitTagRecycle": recycle,
+                             "m_unitTypeName": "Zergling", "m_controlPlayerId": 13, "m_x": 1, "m_y": 1}))
+        alive.append((index, recycle))
+        if len(alive) > 200 or rng.random() < 0.3:
+            index, recycle = alive.pop(rng.randrange(len(alive)))
+            events.append(Event({"_event": "NNet.Replay.Tracker.SUnitDiedEvent", "_gameloop": i,
+                                 "m_unitTagIndex": index, "m_unitTagRecycle": recycle,
+                                 "m_killerPlayerId": rng.randint(1, 8), "m_killerUnitTagIndex": None,
+                                 "m_killerUnitTagRecycle": None, "m_x": 1, "m_y": 1}))
+    return events
+
+
+def track(cls, events: list) -> float:
+    tracked = cls()
+    start = time.perf_counter()
+    for event in events:
+        tracked.fetch(event)
+        if event.unit_born:
+            tracked.add(event)
+    return time.perf_counter() - start
+
+
+def lookups(events: list) -> (float, float):
+    players = [{"player_id": pid, "handle": f"1-S2-1-{pid}"} for pid in range(1, 9)]
+    by_id = {player['player_id']: player for player in players}
+    pids = [event['m_killerPlayerId'] for event in events if event.unit_died]
+
+    start = time.perf_counter()
+    for pid in pids:
+        for player in players:
+            if player['player_id'] == pid:
+                break
+    linear = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for pid in pids:
+        by_id.get(pid)
+    indexed = time.perf_counter() - start
+    return linear, indexed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark unit tracking and player lookup.")
+    parser.add_argument("--units", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    events = long_game(args.units, args.seed)
+    legacy = track(LegacyTrackedUnits, events)
+    current = track(TrackedUnits, events)
+    print(f"{len(events)} events")
+    print(f"string tags   {len(events) / legacy:12.0f} events/s")
+    print(f"integer tags  {len(events) / current:12.0f} events/s  ({legacy / current:.1f}x)")
+
+    linear, indexed = lookups(events)
+    print(f"player scan   {linear:8.4f}s")
+    print(f"player index  {indexed:8.4f}s  ({linear / indexed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
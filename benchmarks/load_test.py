@@ -0,0 +1,119 @@
+"""
+Load test for serve.py: generates a database, serves it, and has several
+client threads request player profiles, match histories, tower meta and the
+leaderboard while another thread keeps ingesting games. Reports p50/p99
+latency per endpoint.
+
+    python benchmarks/load_test.py --games 400 --clients 8 --seconds 10
+"""
+import argparse, json, os, random, sqlite3, sys, tempfile, threading, time, urllib.error, urllib.request
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+from writer import BulkWriter
+from profiler import percentile
+from query import Stats
+from serve import make_server
+from synthetic import SyntheticGame
+from bench_queries import PATCHES, generate
+
+
+def ingest(path: str, players: int, first_id: int, rate: float, stop: threading.Event, done: list):
+    """Writes one synthetic game per commit at `rate` games per second until stopped."""
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA busy_timeout = 5000")
+    game = SyntheticGame(seed=first_id)
+    handles = [f"1-S2-1-{i}" for i in range(players)]
+    writer = BulkWriter(db, commit_interval=1)
+    game_id = first_id
+    while not stop.wait(1.0 / rate):
+        data = game.game_dict(game_id, handles)
+        data['patch'] = PATCHES[-1]
+        writer.add(data)
+        done.append(game_id)
+        game_id += 1
+    db.close()
+
+
+def client(base: str, handles: list, seed: int, stop: threading.Event, latencies: dict, errors: list):
+    rng = random.Random(seed)
+    while not stop.is_set():
+        handle = rng.choice(handles)
+        endpoint, path = rng.choice((
+            ("profile", f"/players/{handle}"),
+            ("matches", f"/players/{handle}/matches?limit=20"),
+            ("towers", f"/towers?patch={rng.choice(PATCHES)}"),
+            ("leaderboard", f"/leaderboard?patch={rng.choice(PATCHES)}&min_games=3"),
+        ))
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(base + path) as response:
+                json.loads(response.read())
+        except (urllib.error.URLError, OSError) as e:
+            errors.append(f"{path}: {e}")
+            continue
+        latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure serve.py latency under concurrent reads and ingest.")
+    parser.add_argument("--games", type=int, default=400)
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--ingest-rate", type=float, default=5.0, help="Games written per second; 0 disables.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "squadron.db")
+        db = generate(path, args.games, args.players, args.seed)
+        handles = [row[0] for row in db.execute("SELECT HANDLE FROM Players")]
+        db.close()
+
+        stats = Stats(path, args.connections)
+        server = make_server(stats, port=0)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        stop = threading.Event()
+        ingested, errors = [], []
+        per_client = [{} for _ in range(args.clients)]
+        threads = [threading.Thread(target=client, args=(base, handles, args.seed + i, stop, per_client[i], errors))
+                   for i in range(args.clients)]
+        if args.ingest_rate > 0:
+            threads.append(threading.Thread(target=ingest, args=(
+                path, args.players, 2000000, args.ingest_rate, stop, ingested)))
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        server.shutdown()
+        server.server_close()
+        stats.close()
+
+    latencies = {}
+    for results in per_client:
+        for endpoint, values in results.items():
+            latencies.setdefault(endpoint, []).extend(values)
+    latencies["all"] = [value for values in latencies.values() for value in values]
+
+    print(f"{args.clients} clients for {args.seconds:.0f}s, {len(ingested)} games ingested meanwhile, "
+          f"{len(errors)} errors")
+    print(f"{'endpoint':12} {'requests':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for endpoint, values in latencies.items():
+        values.sort()
+        print(f"{endpoint:12} {len(values):9d} {percentile(values, 50) * 1000:9.2f} "
+              f"{percentile(values, 99) * 1000:9.2f}")
+    print(f"throughput   {len(latencies['all']) / args.seconds:9.1f} requests/s")
+    print(f"cache        {stats.cache.hits} hits, {stats.cache.misses} misses")
+    for error in errors[:5]:
+        print("error:", error)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Benchmark suite for the parser's hot paths, on synthetic Squadron TD games.
+
+Times Event construction, TrackedUnits, tower de-duplication, the full
+Replay.read() event loop with s2protocol and mpyq stubbed out, and writing
+games to an in-memory SQLite database. Results are printed (or written with
+--output) as JSON so runs can be compared across commits.
+
+    python benchmarks/run.py --output bench_output.json
+"""
+import argparse, datetime, json, os, platform, sqlite3, subprocess, sys, time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, "..", "src")
+sys.path.insert(0, SRC)
+
+from event import Event
+from tracker import TrackedUnits, TowerIndex, tower_in_list
+from writer import BulkWriter, insert_game
+import schema, sqreplay
+from synthetic import SyntheticGame, stubbed
+
+
+def best_of(repeat: int, setup, run) -> float:
+    """Smallest wall time of `repeat` runs; setup() output is passed to run() and not timed."""
+    times = []
+    for _ in range(repeat):
+        data = setup()
+        start = time.perf_counter()
+        run(data)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def result(seconds: float, ops: int, unit: str) -> dict:
+    return {"seconds": seconds, "ops": ops, "unit": unit, "per_second": ops / seconds if seconds else None}
+
+
+def bench_events(game: SyntheticGame, repeat: int) -> dict:
+    ops = len(game.tracker_events())
+
+    def run(raw):
+        for data in raw:
+            event = Event(data)
+            if event.unit_born or event.unit_init:
+                event['m_unitTypeName']
+
+    return result(best_of(repeat, game.tracker_events, run), ops, "events")
+
+
+def bench_tracked_units(game: SyntheticGame, repeat: int) -> dict:
+    events = [Event(data) for data in game.tracker_events()]
+    events = [event for event in events if event.unit_born or event.unit_init or event.unit_died]
+
+    def run(events):
+        tracked = TrackedUnits()
+        for event in events:
+            if event.unit_died:
+                if tracked.fetch(event) is not None:
+                    tracked.delete(event)
+            else:
+                tracked.add(event)
+
+    return result(best_of(repeat, lambda: events, run), len(events), "events")
+
+
+def tower_stream(game: SyntheticGame) -> list:
+    towers = []
+    wave = 0
+    for data in game.tracker_events():
+        event = Event(data)
+        if not (event.unit_born or event.unit_init):
+            continue
+        name = event['m_unitTypeName']
+        if name.startswith("Wave"):
+            wave = int(name[4:])
+        elif name[0] == "f":
+            towers.append({"builder": event['m_controlPlayerId'], "type": name, "wave": wave,
+                           "posx": event['m_x'], "posy": event['m_y']})
+    return towers
+
+
+def bench_towers(game: SyntheticGame, repeat: int) -> dict:
+    stream = tower_stream(game)
+
+    def indexed(stream):
+        index = TowerIndex()
+        for tower in stream:
+            if not index.near(tower):
+                index.add(tower)
+
+    def linear(stream):
+        towers = []
+        for tower in stream:
+            if not tower_in_list(towers, tower):
+                towers.append(tower)
+
+    return {
+        "tower_index": result(best_of(repeat, lambda: stream, indexed), len(stream), "towers"),
+        "tower_in_list": result(best_of(repeat, lambda: stream, linear), len(stream), "towers"),
+    }
+
+
+def bench_read(sqreplay, game: SyntheticGame, repeat: int) -> dict:
+    ops = len(game.tracker_events())
+
+    def run(_):
+        replay = sqreplay.Replay(b"synthetic replay", False)
+        _err, data = replay.read()
+        if _err:
+            raise RuntimeError(f"Synthetic replay rejected: {data}")
+
+    with stubbed(sqreplay, game):
+        return result(best_of(repeat, lambda: None, run), ops, "events")
+
+
+def bench_insert(game: SyntheticGame, games: int, repeat: int) -> dict:
+    # game_dict() samples its players from the pool, so it needs at least that many handles.
+    handles = [f"1-S2-1-{i}" for i in range(max(games, game.players))]
+    dicts = [game.game_dict(1000000 + i, handles) for i in range(games)]
+
+    def connect():
+        db = sqlite3.connect(":memory:")
+        schema.upgrade(db)
+        return db
+
+    def rows(db):
+        for data in dicts:
+            insert_game(db, data)
+
+    def bulk(db):
+        with BulkWriter(db, commit_interval=100) as writer:
+            for data in dicts:
+                writer.add(data)
+
+    return {
+        "insert_game": result(best_of(repeat, connect, rows), games, "games"),
+        "bulk_writer": result(best_of(repeat, connect, bulk), games, "games"),
+    }
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=HERE, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the SQReplay benchmark suite.")
+    parser.add_argument("--waves", type=int, default=30)
+    parser.add_argument("--players", type=int, default=8)
+    parser.add_argument("--towers", type=int, default=4, help="Average towers per player per wave.")
+    parser.add_argument("--sends", type=int, default=1, help="Average sends per player per wave.")
+    parser.add_argument("--workers", type=float, default=0.3, help="Chance of a worker per player per wave.")
+    parser.add_argument("--games", type=int, default=200, help="Games written by the insert benchmarks.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=str, help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args()
+
+    game = SyntheticGame(args.waves, args.players, args.towers, args.sends, args.workers, seed=args.seed)
+
+    results = {
+        "event_construction": bench_events(game, args.repeat),
+        "tracked_units": bench_tracked_units(game, args.repeat),
+        "replay_read": bench_read(sqreplay, game, args.repeat),
+    }
+    results.update(bench_towers(game, args.repeat))
+    results.update(bench_insert(game, args.games, args.repeat))
+
+    report = {
+        "commit": commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": vars(args),
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=4, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Synthetic Squadron TD games for the benchmarks.
+
+SyntheticGame produces tracker event streams shaped like real games, using
+the unit naming handle_unit() relies on: Wave<n> spawns, <Name>Builder,
+f<Name> towers, Send_<Name> sends and SquadronWorker. StubProtocol and
+StubArchive stand in for s2protocol and mpyq so Replay can run on it
+without a replay file; stubbed() installs them, for the benchmarks and
+the tests alike.
+"""
+import contextlib, json, random
+
+TRACKER_EVENT_TYPES = {
+    0: (197, 'NNet.Replay.Tracker.SPlayerStatsEvent'),
+    1: (199, 'NNet.Replay.Tracker.SUnitBornEvent'),
+    2: (200, 'NNet.Replay.Tracker.SUnitDiedEvent'),
+    3: (201, 'NNet.Replay.Tracker.SUnitOwnerChangeEvent'),
+    4: (202, 'NNet.Replay.Tracker.SUnitTypeChangeEvent'),
+    5: (203, 'NNet.Replay.Tracker.SUpgradeEvent'),
+    6: (204, 'NNet.Replay.Tracker.SUnitInitEvent'),
+    7: (205, 'NNet.Replay.Tracker.SUnitDoneEvent'),
+    8: (207, 'NNet.Replay.Tracker.SUnitPositionsEvent'),
+    9: (208, 'NNet.Replay.Tracker.SPlayerSetupEvent'),
+}
+EVENT_IDS = {name.split('.')[-1]: eventid for eventid, (_, name) in TRACKER_EVENT_TYPES.items()}
+
+BUILDERS = ["ChaosBuilder", "ProtossBuilder", "ZergBuilder", "TerranBuilder", "MechBuilder"]
+TOWERS = [f"f{name}" for name in ("Marine", "Marauder", "Tank", "Bunker", "Zealot", "Stalker", "Hydralisk",
+                                  "Roach", "Ultralisk", "Archon", "Thor", "Carrier", "SwarmLocust")]
+SENDS = [f"Send_{name}" for name in ("Zergling", "Baneling", "Roach", "Mutalisk", "Ultralisk", "Broodlord")]
+CREEP_OWNERS = (13, 14)
+
+# SecuritySystem deaths at these positions end the game (see Replay.handle_death).
+EAST_WINS = (70, 0)
+WEST_WINS = (70, 10)
+
+GAME_ID = 1587249790
+
+
+class SyntheticGame:
+
+    def __init__(self, waves=20, players=8, towers=4, sends=1, workers=0.3, creeps=12, seed=1):
+        self.waves = waves
+        self.players = players
+        self.towers = towers
+        self.sends = sends
+        self.workers = workers
+        self.creeps = creeps
+        self.seed = seed
+
+    def tracker_events(self) -> list:
+        """A fresh list of raw tracker event dicts (Event decodes them in place)."""
+        rng = random.Random(self.seed)
+        events = []
+        state = {"loop": 0, "tag": 0}
+
+        def add(kind, **fields):
+            event = {'_event': 'NNet.Replay.Tracker.' + kind, '_eventid': EVENT_IDS[kind],
+                     '_gameloop': state["loop"]}
+            event.update(fields)
+            events.append(event)
+
+        def unit(name, owner, x=50, y=50, kind='SUnitBornEvent'):
+            state["tag"] += 1
+            add(kind, m_unitTagIndex=state["tag"] & 0x3FFF, m_unitTagRecycle=(state["tag"] >> 14) + 1,
+                m_unitTypeName=name.encode(), m_controlPlayerId=owner, m_upkeepPlayerId=owner, m_x=x, m_y=y,
+                m_creatorAbilityName=None, m_creatorUnitTagIndex=None, m_creatorUnitTagRecycle=None)
+            return events[-1]
+
+        pids = range(1, self.players + 1)
+        for pid in pids:
+            add('SPlayerSetupEvent', m_userId=pid - 1, m_playerId=pid, m_type=1, m_slotId=pid - 1)
+        for pid in pids:
+            unit(rng.choice(BUILDERS), pid)
+
+        for wave in range(1, self.waves + 1):
+            state["loop"] += 400
+            add('SUpgradeEvent', m_playerId=0, m_upgradeTypeName=b'BuildPhase', m_count=1)
+            unit(f"Wave{wave}", rng.choice(CREEP_OWNERS))
+            for pid in pids:
+                base_x, base_y = 20 + pid * 12, 20
+                for _ in range(rng.randint(0, self.towers * 2)):
+                    unit(rng.choice(TOWERS), pid, base_x + rng.randint(0, 8), base_y + rng.randint(0, 8),
+                         kind=rng.choice(['SUnitInitEvent', 'SUnitBornEvent']))
+                if rng.random() < self.workers:
+                    unit("SquadronWorker", pid)
+                    add('SUpgradeEvent', m_playerId=pid, m_upgradeTypeName=b'RefinerySpeed', m_count=1)
+                for _ in range(rng.randint(0, self.sends * 2)):
+                    unit(rng.choice(SENDS), pid)
+                if wave % 5 == 0:
+                    unit(rng.choice(BUILDERS), pid)
+                add('SPlayerStatsEvent', m_playerId=pid, m_stats={f"m_score{i}": rng.randint(0, 5000)
+                                                                  for i in range(39)})
+
+            state["loop"] += 200
+            add('SUpgradeEvent', m_playerId=0, m_upgradeTypeName=b'FightPhase', m_count=1)
+            creeps = [unit("Zergling", CREEP_OWNERS[wave % 2]) for _ in range(self.creeps * self.players)]
+            for creep in creeps:
+                state["loop"] += 1
+                add('SUnitDiedEvent', m_unitTagIndex=creep['m_unitTagIndex'],
+                    m_unitTagRecycle=creep['m_unitTagRecycle'], m_killerPlayerId=rng.choice(pids),
+                    m_killerUnitTagIndex=None, m_killerUnitTagRecycle=None, m_x=1, m_y=1)
+
+        state["loop"] += 10
+        security = unit("SecuritySystem", 14, 70, 0, kind='SUnitInitEvent')
+        state["loop"] += 10
+        x, y = EAST_WINS
+        add('SUnitDiedEvent', m_unitTagIndex=security['m_unitTagIndex'],
+            m_unitTagRecycle=security['m_unitTagRecycle'], m_killerPlayerId=2,
+            m_killerUnitTagIndex=None, m_killerUnitTagRecycle=None, m_x=x, m_y=y)
+
+        # Post-game lobby: stats keep coming until the players leave.
+        for i in range(self.players * 10):
+            state["loop"] += 160
+            add('SPlayerStatsEvent', m_playerId=1 + i % self.players, m_stats={"m_score0": 0})
+        return events
+
+    def game_events(self):
+        for loop in range(50):
+            yield {'_event': 'NNet.Game.SCameraUpdateEvent', '_eventid': 49, '_gameloop': loop, '_userid': 0}
+        yield {'_event': 'NNet.Game.SSetSyncLoadingTimeEvent', '_eventid': 104, '_gameloop': 50, '_userid': 0,
+               'm_syncTime': GAME_ID}
+        for loop in range(50, 5000):
+            yield {'_event': 'NNet.Game.SCameraUpdateEvent', '_eventid': 49, '_gameloop': loop, '_userid': 0}
+
+    def details(self) -> dict:
+        return {'m_playerList': [
+            {'m_toon': {'m_region': 1, 'm_realm': 1, 'm_id': 1000 + slot},
+             'm_color': {'m_r': slot, 'm_g': 0, 'm_b': 0, 'm_a': 255},
+             'm_name': f"&lt;CLAN&gt;<sp/>Player{slot}".encode(),
+             'm_workingSetSlotId': slot, 'm_teamId': slot % 2}
+            for slot in range(self.players)
+        ]}
+
+    def init_data(self) -> dict:
+        slots = [{'m_workingSetSlotId': slot, 'm_userId': slot} for slot in range(self.players)]
+        return {'m_syncLobbyState': {'m_lobbyState': {'m_slots': slots}}}
+
+    def attributes(self) -> dict:
+        # 0002 = Dynamic gamemode, 0002 = 1x creeps.
+        return {'scopes': {16: {6: [{'value': b'0002'}], 2: [{'value': b'0002'}]}}}
+
+    def metadata(self) -> dict:
+        return {'Title': 'Squadron TD'}
+
+    def game_dict(self, game_id: int, handles: list) -> dict:
+        """A game dict in the shape Replay.read() returns, for the write benchmarks."""
+        rng = random.Random(self.seed + game_id)
+        players = []
+        for pid, handle in enumerate(rng.sample(handles, self.players), start=1):
+            players.append({"name": f"Player{pid}", "handle": handle, "user_id": pid - 1, "player_id": pid,
+                            "color": (0, 0, 0), "team": "East" if pid % 2 else "West", "won": pid % 2 == 1})
+        pids = [player['player_id'] for player in players]
+        return {
+            "id": game_id,
+            "patch": "8.14",
+            "creeps": "1x",
+            "gamemode": "Chaos",
+            "end_wave": self.waves,
+            "players": players,
+            "towers": [{"builder": rng.choice(pids), "type": rng.choice(TOWERS), "wave": rng.randint(0, self.waves),
+                        "posx": 0, "posy": 0} for _ in range(self.towers * self.players * self.waves)],
+            "sends": [{"player": rng.choice(pids), "type": rng.choice(SENDS), "wave": rng.randint(1, self.waves)}
+                      for _ in range(self.sends * self.players * self.waves)],
+            "buildersByWave": [{"player": pid, "type": rng.choice(BUILDERS), "wave": wave}
+                               for pid in pids for wave in range(0, self.waves, 5)],
+            "workers": [{"player": pid, "wave": n, "number": n} for pid in pids
+                        for n in range(1, int(self.workers * self.waves) + 1)],
+            "upgrades": [{"player": pid, "wave": n, "number": n} for pid in pids
+                         for n in range(1, int(self.workers * self.waves) + 1)]
+        }
+
+
+class StubProtocol:
+    """Stands in for an s2protocol protocol module, decoding from a SyntheticGame."""
+
+    __name__ = "protocol78285"
+    tracker_event_types = TRACKER_EVENT_TYPES
+
+    def __init__(self, game: SyntheticGame):
+        self.game = game
+
+    def decode_replay_header(self, contents):
+        return {'m_version': {'m_baseBuild': 78285}}
+
+    def decode_replay_game_events(self, contents):
+        return self.game.game_events()
+
+    def decode_replay_tracker_events(self, contents):
+        return iter(self.game.tracker_events())
+
+    def decode_replay_initdata(self, contents):
+        return self.game.init_data()
+
+    def decode_replay_details(self, contents):
+        return self.game.details()
+
+    def decode_replay_attributes_events(self, contents):
+        return self.game.attributes()
+
+
+class StubArchive:
+    """Stands in for mpyq.MPQArchive. Members are placeholders the stub protocol ignores."""
+
+    def __init__(self, game: SyntheticGame):
+        self.game = game
+        self.header = {'user_data_header': {'content': b''}}
+
+    def read_file(self, name):
+        if name == 'replay.gamemetadata.json':
+            return json.dumps(self.game.metadata()).encode('utf-8')
+        return name.encode('utf-8')
+
+
+@contextlib.contextmanager
+def stubbed(sqreplay, game: SyntheticGame):
+    """Points sqreplay at the stub archive and protocol for the duration, and yields the protocol."""
+    from protocols import ProtocolRegistry
+    protocol = StubProtocol(game)
+
+    class Versions:
+        @staticmethod
+        def list_all():
+            return [f"{protocol.__name__}.py"]
+
+        @staticmethod
+        def build(build):
+            return protocol
+
+    archive, protocols = sqreplay.mpyq.MPQArchive, sqreplay.PROTOCOLS
+    sqreplay.mpyq.MPQArchive = lambda source, listfile=True: StubArchive(game)
+    sqreplay.PROTOCOLS = ProtocolRegistry(Versions)
+    try:
+        yield protocol
+    finally:
+        sqreplay.mpyq.MPQArchive, sqreplay.PROTOCOLS = archive, protocols
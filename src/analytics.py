@@ -0,0 +1,252 @@
+import typing
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("Analytics need numpy: pip install numpy") from None
+
+from records import GameRecord
+
+# Player slots are player_id - 1; Squadron TD has eight players.
+PLAYERS = 8
+TEAMS = ("East", "West")
+# Events handled per step when building the arrays.
+CHUNK = 1 << 22
+
+
+class Events(typing.NamedTuple):
+    """One row per event as parallel arrays. code is the type index for towers and builders."""
+    game: np.ndarray
+    slot: np.ndarray
+    wave: np.ndarray
+    code: typing.Optional[np.ndarray] = None
+
+
+class Timeline:
+    """
+    Many games as arrays shaped (games, players, waves). Counts are events
+    per player per wave; builders holds the index into builder_names of the
+    builder a player took on a wave, or -1.
+    """
+
+    def __init__(self, game_ids, end_wave, present, won, team, workers, upgrades, sends, towers, tower_value,
+                 builders, tower_names, builder_names):
+        self.game_ids = game_ids
+        self.end_wave = end_wave
+        self.present = present
+        self.won = won
+        self.team = team
+        self.workers = workers
+        self.upgrades = upgrades
+        self.sends = sends
+        self.towers = towers
+        self.tower_value = tower_value
+        self.builders = builders
+        self.tower_names = tower_names
+        self.builder_names = builder_names
+
+    @property
+    def shape(self) -> tuple:
+        return self.workers.shape
+
+    @classmethod
+    def from_events(cls, game_ids, end_wave, players: Events, won, team, workers: Events, upgrades: Events,
+                    sends: Events, towers: Events, builders: Events, tower_names, builder_names,
+                    tower_values: dict = None) -> "Timeline":
+        """
+        Builds the arrays from flat event arrays. players gives each player's
+        game and slot, with won and team (0 East, 1 West) alongside it.
+        Events with a slot outside 0-7, such as observers, are dropped.
+        tower_values maps tower names to a value; towers default to 1 each.
+        """
+        game_ids = np.asarray(game_ids, dtype=np.int64)
+        end_wave = np.asarray(end_wave, dtype=np.int16)
+        games = len(game_ids)
+        waves = int(max([end_wave.max(initial=0)] + [e.wave.max(initial=0) for e in
+                                                       (workers, upgrades, sends, towers, builders)])) + 1
+        shape = (games, PLAYERS, waves)
+
+        slot_ok = (players.slot >= 0) & (players.slot < PLAYERS)
+        g, s = players.game[slot_ok], players.slot[slot_ok]
+        present = np.zeros(shape[:2], dtype=bool)
+        present[g, s] = True
+        won_array = np.zeros(shape[:2], dtype=bool)
+        won_array[g, s] = np.asarray(won, dtype=bool)[slot_ok]
+        team_array = np.full(shape[:2], -1, dtype=np.int8)
+        team_array[g, s] = np.asarray(team, dtype=np.int8)[slot_ok]
+
+        values = np.ones(len(tower_names), dtype=np.float32)
+        if tower_values:
+            values = np.array([tower_values.get(name, 0.0) for name in tower_names], dtype=np.float32)
+
+        def keep(events: Events) -> Events:
+            ok = (events.slot >= 0) & (events.slot < PLAYERS)
+            if ok.all():
+                return events
+            return Events(*(None if a is None else np.asarray(a)[ok] for a in events))
+
+        def counts(events: Events, weights=None, dtype=np.uint16) -> np.ndarray:
+            # Chunked to bound the size of the flat index temporaries on large loads.
+            array = np.zeros(shape, dtype=dtype)
+            for start in range(0, len(events.game), CHUNK):
+                chunk = slice(start, start + CHUNK)
+                flat = np.ravel_multi_index((events.game[chunk], events.slot[chunk], events.wave[chunk]), shape)
+                add = np.ones(len(flat), dtype=dtype) if weights is None else weights(chunk)
+                np.add.at(array.reshape(-1), flat, add)
+            return array
+
+        towers = keep(towers)
+        builders = keep(builders)
+        builder_array = np.full(shape, -1, dtype=np.int16)
+        # The first builder a player took on a wave is the one kept.
+        flat, first = np.unique(np.ravel_multi_index((builders.game, builders.slot, builders.wave), shape),
+                                return_index=True)
+        builder_array.reshape(-1)[flat] = builders.code[first]
+
+        return cls(game_ids, end_wave, present, won_array, team_array,
+                   counts(keep(workers)), counts(keep(upgrades)), counts(keep(sends)), counts(towers),
+                   counts(towers, lambda chunk: values[towers.code[chunk]], np.float32), builder_array,
+                   list(tower_names), list(builder_names))
+
+
+def load_games(games: typing.Iterable[GameRecord], tower_values: dict = None) -> Timeline:
+    """Builds a Timeline from GameRecords, as returned by parse_replay()."""
+    game_ids, end_wave = [], []
+    player_rows, won, team = [], [], []
+    rows = {"workers": [], "upgrades": [], "sends": [], "towers": [], "builders": []}
+    names = {"towers": {}, "builders": {}}
+
+    def code(kind, name):
+        return names[kind].setdefault(name, len(names[kind]))
+
+    for g, game in enumerate(games):
+        game_ids.append(game['id'])
+        end_wave.append(game['end_wave'])
+        for player in game['players']:
+            if player['player_id'] is None:
+                continue
+            player_rows.append((g, player['player_id'] - 1))
+            won.append(player['won'])
+            team.append(TEAMS.index(player['team']) if player['team'] in TEAMS else -1)
+        rows["workers"].extend((g, w['player'] - 1, w['wave'], 0) for w in game['workers'])
+        rows["upgrades"].extend((g, u['player'] - 1, u['wave'], 0) for u in game['upgrades'])
+        rows["sends"].extend((g, s['player'] - 1, s['wave'], 0) for s in game['sends'])
+        rows["towers"].extend((g, t['builder'] - 1, t['wave'], code("towers", t['type'])) for t in game['towers'])
+        rows["builders"].extend((g, b['player'] - 1, b['wave'], code("builders", b['type']))
+                                for b in game['buildersByWave'])
+
+    def events(kind) -> Events:
+        array = np.array(rows[kind], dtype=np.int64).reshape(-1, 4)
+        return Events(array[:, 0], array[:, 1], array[:, 2], array[:, 3])
+
+    players = np.array(player_rows, dtype=np.int64).reshape(-1, 2)
+    return Timeline.from_events(
+        game_ids, end_wave, Events(players[:, 0], players[:, 1], None), won, team,
+        events("workers"), events("upgrades"), events("sends"), events("towers"), events("builders"),
+        list(names["towers"]), list(names["builders"]), tower_values
+    )
+
+
+def load_dataset(directory, tower_values: dict = None) -> Timeline:
+    """Builds a Timeline from a Parquet export (see export.py) without going through Python rows."""
+    from export import dataset
+
+    def table(name, columns):
+        return dataset(directory, name).to_table(columns=columns).unify_dictionaries().combine_chunks()
+
+    def ints(column) -> np.ndarray:
+        return column.to_numpy(zero_copy_only=False).astype(np.int64)
+
+    def coded(column):
+        column = column.combine_chunks() if hasattr(column, "combine_chunks") else column
+        return ints(column.indices.fill_null(-1)), column.dictionary.to_pylist()
+
+    games = table("games", ["game_id", "end_wave"])
+    game_ids = ints(games["game_id"])
+    order = np.argsort(game_ids, kind="stable")
+    sorted_ids = game_ids[order]
+
+    def index(column) -> np.ndarray:
+        return order[np.searchsorted(sorted_ids, ints(column))]
+
+    def events(name, with_code=False):
+        t = table(name, ["game_id", "player_id", "wave"] + (["type"] if with_code else []))
+        codes, names = coded(t["type"]) if with_code else (None, None)
+        return Events(index(t["game_id"]), ints(t["player_id"].fill_null(0)) - 1, ints(t["wave"]), codes), names
+
+    players = table("players", ["game_id", "player_id", "won", "team"])
+    team_codes, team_names = coded(players["team"])
+    team = np.array([TEAMS.index(name) if name in TEAMS else -1 for name in team_names] + [-1])[team_codes]
+    towers, tower_names = events("towers", True)
+    builders, builder_names = events("builders", True)
+    return Timeline.from_events(
+        game_ids, games["end_wave"].to_numpy(),
+        Events(index(players["game_id"]), ints(players["player_id"].fill_null(0)) - 1, None),
+        players["won"].to_numpy(zero_copy_only=False), team,
+        events("workers")[0], events("upgrades")[0], events("sends")[0], towers, builders,
+        tower_names, builder_names, tower_values
+    )
+
+
+def _alive(timeline: Timeline) -> np.ndarray:
+    """(games, players, waves) mask of players in a game that had not yet ended."""
+    waves = np.arange(timeline.shape[2])
+    return timeline.present[:, :, None] & (waves[None, None, :] <= timeline.end_wave[:, None, None])
+
+
+def _by_outcome(values: np.ndarray, timeline: Timeline) -> dict:
+    """Per-wave mean of a (games, players, waves) array over all, winning and losing players."""
+    alive = _alive(timeline)
+    won = timeline.won[:, :, None]
+    result = {}
+    for name, mask in (("all", alive), ("winners", alive & won), ("losers", alive & ~won)):
+        total = np.where(mask, values, 0).sum(axis=(0, 1), dtype=np.float64)
+        players = mask.sum(axis=(0, 1))
+        result[name] = np.divide(total, players, out=np.zeros_like(total), where=players > 0)
+    return result
+
+
+def economy_curve(timeline: Timeline) -> dict:
+    """
+    Average workers and gas speed upgrades a player has by each wave, for
+    all, winning and losing players: {"workers": {"all": (waves,), ...}, "upgrades": ...}.
+    """
+    return {
+        "workers": _by_outcome(np.cumsum(timeline.workers, axis=2, dtype=np.float32), timeline),
+        "upgrades": _by_outcome(np.cumsum(timeline.upgrades, axis=2, dtype=np.float32), timeline),
+    }
+
+
+def tower_value_curve(timeline: Timeline) -> dict:
+    """Average tower value a player builds on each wave, for all, winning and losing players."""
+    return _by_outcome(timeline.tower_value, timeline)
+
+
+def send_pressure(timeline: Timeline) -> dict:
+    """Average sends a team makes on each wave, for the winning and the losing team."""
+    waves = np.arange(timeline.shape[2])
+    alive = waves[None, :] <= timeline.end_wave[:, None]
+    sends = timeline.sends.astype(np.float32)
+    winners = np.where(timeline.present & timeline.won, 1.0, 0.0).astype(np.float32)
+    losers = np.where(timeline.present & ~timeline.won, 1.0, 0.0).astype(np.float32)
+    games = alive.sum(axis=0)
+    result = {}
+    for name, side in (("winners", winners), ("losers", losers)):
+        total = np.einsum("gpw,gp->gw", sends, side)
+        total = np.where(alive, total, 0).sum(axis=0, dtype=np.float64)
+        result[name] = np.divide(total, games, out=np.zeros_like(total), where=games > 0)
+    return result
+
+
+def builder_win_rates(timeline: Timeline) -> typing.List[tuple]:
+    """(builder, games, wins, win rate) for the first builder each player took, most played first."""
+    taken = timeline.builders >= 0
+    first = np.take_along_axis(timeline.builders, taken.argmax(axis=2)[:, :, None], axis=2)[:, :, 0]
+    mask = taken.any(axis=2) & timeline.present
+    codes = first[mask].astype(np.int64)
+    size = len(timeline.builder_names)
+    games = np.bincount(codes, minlength=size)
+    wins = np.bincount(codes, weights=timeline.won[mask], minlength=size).astype(np.int64)
+    order = np.argsort(-games, kind="stable")
+    return [(timeline.builder_names[i], int(games[i]), int(wins[i]), float(wins[i] / games[i]))
+            for i in order if games[i]]
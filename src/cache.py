@@ -0,0 +1,215 @@
+import functools, json, os, sys, tempfile, typing, zlib
+from array import array
+
+from event import EVENT_KINDS, UNIT_INIT, UNIT_BORN, UNIT_DIED, UPGRADE_EVENT, PLAYER_SETUP
+
+
+@functools.lru_cache(maxsize=None)
+def s2protocol_version() -> str:
+    # importlib.metadata is slow to import, so only look the version up once an entry is read or written.
+    try:
+        from importlib.metadata import version as _package_version
+        return _package_version("s2protocol")
+    except Exception:
+        return "unknown"
+
+
+# Bump when the layout below changes; older entries are then ignored and replaced.
+FORMAT_VERSION = 1
+MAGIC = b"SQRC"
+SUFFIX = ".sqc"
+
+# The tracker events Replay.read() uses, and the fields of each that it reads.
+FIELDS = {
+    UNIT_INIT: ('m_unitTagIndex', 'm_unitTagRecycle', 'm_unitTypeName', 'm_controlPlayerId', 'm_x', 'm_y'),
+    UNIT_BORN: ('m_unitTagIndex', 'm_unitTagRecycle', 'm_unitTypeName', 'm_controlPlayerId', 'm_x', 'm_y'),
+    UNIT_DIED: ('m_unitTagIndex', 'm_unitTagRecycle', 'm_killerPlayerId', 'm_x', 'm_y'),
+    UPGRADE_EVENT: ('m_playerId', 'm_upgradeTypeName'),
+    PLAYER_SETUP: ('m_userId', 'm_playerId'),
+}
+KINDS = frozenset(FIELDS)
+
+# Name fields are stored as indexes into a per-replay string table.
+STRING_FIELDS = ('m_unitTypeName', 'm_upgradeTypeName')
+COLUMNS = ('_eventid', '_gameloop') + tuple(sorted({f for fields in FIELDS.values() for f in fields}))
+
+# Stands in for None and for fields an event kind does not have.
+MISSING = -2 ** 31
+
+# Stores between directory scans even while under max_bytes, to pick up what other processes wrote.
+RESCAN_STORES = 256
+
+# One cache per directory in each process, see SummaryCache.__reduce__().
+_shared = {}
+
+
+def _shared_cache(directory: str, max_bytes: int) -> "SummaryCache":
+    cache = _shared.get((directory, max_bytes))
+    if cache is None:
+        cache = _shared[(directory, max_bytes)] = SummaryCache(directory, max_bytes)
+    return cache
+
+
+class SummaryCache:
+    """
+    On-disk cache of the tracker events Replay.read() uses, one file per
+    replay content hash.
+
+    Each entry stores the events column by column as int32 arrays (names go
+    through a string table), zlib-compressed behind a small JSON header. The
+    header records the protocol module and s2protocol version the events were
+    decoded with; an entry written by any other build is treated as a miss and
+    overwritten. The directory is kept under max_bytes by evicting the least
+    recently used entries.
+
+    A cache pickled into worker jobs unpickles to one shared instance per
+    worker process, so the running size estimate outlives a single job and
+    the directory is only scanned every RESCAN_STORES stores or when the
+    estimate passes max_bytes.
+
+    An entry is partial when read() stopped once the game's outcome was
+    known; it holds every event such a read needs, but a full scan treats it
+    as a miss and replaces it.
+    """
+
+    def __init__(self, directory, max_bytes=1 << 30):
+        self.directory = os.path.abspath(str(directory))
+        self.max_bytes = max_bytes
+        self._total = None
+        self._stores = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __reduce__(self):
+        return _shared_cache, (self.directory, self.max_bytes)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest + SUFFIX)
+
+    @staticmethod
+    def _protocol_key(protocol) -> str:
+        return f"{protocol.__name__}/{s2protocol_version()}"
+
+    def load(self, digest: str, protocol, partial=False) -> typing.Optional[typing.List[dict]]:
+        """Returns the cached events as raw event dicts, or None on a miss. Partial entries count only if partial."""
+        path = self._path(digest)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        if data[:4] != MAGIC:
+            return None
+        header_size = int.from_bytes(data[4:8], "little")
+        header = json.loads(data[8:8 + header_size].decode("utf-8"))
+        if header['format'] != FORMAT_VERSION or header['protocol'] != self._protocol_key(protocol):
+            return None
+        if not header.get('complete', True) and not partial:
+            return None
+
+        body = zlib.decompress(data[8 + header_size:])
+        count = header['count']
+        columns = {}
+        for index, name in enumerate(COLUMNS):
+            column = array('i')
+            column.frombytes(body[index * count * column.itemsize:(index + 1) * count * column.itemsize])
+            if header['byteorder'] != sys.byteorder:
+                column.byteswap()
+            columns[name] = column
+
+        # Bump the mtime so eviction treats this entry as recently used.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        strings = [s.encode("utf-8") for s in header['strings']]
+        names = {int(k): v for k, v in header['events'].items()}
+        eventids, gameloops = columns['_eventid'], columns['_gameloop']
+
+        events = []
+        for row in range(count):
+            eventid = eventids[row]
+            event = {'_event': names[eventid], '_eventid': eventid, '_gameloop': gameloops[row]}
+            for field in FIELDS[EVENT_KINDS[names[eventid]]]:
+                value = columns[field][row]
+                if value == MISSING:
+                    value = None
+                elif field in STRING_FIELDS:
+                    value = strings[value]
+                event[field] = value
+            events.append(event)
+        return events
+
+    def store(self, digest: str, protocol, events: typing.List[dict], complete=True) -> None:
+        strings = {}
+        names = {}
+        columns = {name: array('i') for name in COLUMNS}
+
+        for event in events:
+            eventid = event['_eventid']
+            names[eventid] = event['_event']
+            fields = FIELDS[EVENT_KINDS[event['_event']]]
+            for name in COLUMNS:
+                if name == '_eventid' or name == '_gameloop':
+                    value = event[name]
+                elif name not in fields:
+                    value = MISSING
+                else:
+                    value = event.get(name)
+                    if value is None:
+                        value = MISSING
+                    elif name in STRING_FIELDS:
+                        if isinstance(value, str):
+                            value = value.encode("utf-8")
+                        value = strings.setdefault(value, len(strings))
+                columns[name].append(value)
+
+        header = json.dumps({
+            'format': FORMAT_VERSION,
+            'protocol': self._protocol_key(protocol),
+            'byteorder': sys.byteorder,
+            'count': len(events),
+            'complete': complete,
+            'events': names,
+            'strings': [s.decode("utf-8") for s in strings],
+        }).encode("utf-8")
+        body = zlib.compress(b"".join(columns[name].tobytes() for name in COLUMNS))
+        data = MAGIC + len(header).to_bytes(4, "little") + header + body
+
+        # Write to a temporary file and swap it in, so workers never see half an entry.
+        fd, temp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp, self._path(digest))
+
+        self._stores += 1
+        if self._total is not None:
+            self._total += len(data)
+        if self._total is None or self._total > self.max_bytes or self._stores >= RESCAN_STORES:
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(SUFFIX):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            # Evict down to 90% so the next few stores do not trigger another scan.
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+        self._total = total
+        self._stores = 0
@@ -1,19 +1,87 @@
-import typing, datetime
+import typing, datetime, weakref
+from collections import deque
+from collections.abc import Mapping
 from decimal import Decimal
 
 
-class Event(dict):
+# Integer codes for the event types the parser checks, resolved once per event.
+OTHER = 0
+UNIT_BORN = 1
+UNIT_INIT = 2
+UNIT_DONE = 3
+UNIT_DIED = 4
+STATS_UPDATE = 5
+TIME_EVENT = 6
+PLAYER_SETUP = 7
+UPGRADE_EVENT = 8
+UNIT_OWNER_TRANSFERRED = 9
+UNIT_TYPE_CHANGED = 10
+MESSAGE_RECEIVED = 11
+
+EVENT_KINDS = {
+    'NNet.Replay.Tracker.SUnitBornEvent': UNIT_BORN,
+    'NNet.Replay.Tracker.SUnitInitEvent': UNIT_INIT,
+    'NNet.Replay.Tracker.SUnitDoneEvent': UNIT_DONE,
+    'NNet.Replay.Tracker.SUnitDiedEvent': UNIT_DIED,
+    'NNet.Replay.Tracker.SPlayerStatsEvent': STATS_UPDATE,
+    'NNet.Game.SSetSyncLoadingTimeEvent': TIME_EVENT,
+    'NNet.Replay.Tracker.SPlayerSetupEvent': PLAYER_SETUP,
+    'NNet.Replay.Tracker.SUpgradeEvent': UPGRADE_EVENT,
+    'NNet.Replay.Tracker.SUnitOwnerChangeEvent': UNIT_OWNER_TRANSFERRED,
+    'NNet.Replay.Tracker.SUnitTypeChangeEvent': UNIT_TYPE_CHANGED,
+    'NNet.Game.SChatMessage': MESSAGE_RECEIVED,
+}
+
+
+class Event(Mapping):
+    """
+    Read-only view over an event dict yielded by s2protocol.
+
+    The decoded dict is wrapped rather than copied. bytes values (unit and
+    upgrade names) are decoded to str the first time they are read, so fields
+    nobody looks at are never decoded.
+    """
+
+    __slots__ = ('_data', '_event', 'kind')
 
     def __init__(self, *args, **kwargs):
-        super(Event, self).__init__(*args, **kwargs)
-        self._event = self.get('_event')
+        if len(args) == 1 and not kwargs and type(args[0]) is dict:
+            data = args[0]
+        else:
+            data = dict(*args, **kwargs)
 
-        # The default return value is bytes for quite a few of the units.
-        # Encode them to strings for easier parsing.
-        for key, value in self.items():
-            if isinstance(value, bytes):
-                value:bytes
-                self[key] = value.decode(encoding='utf-8')
+        self._data = data
+        self._event = data.get('_event')
+        self.kind = EVENT_KINDS.get(self._event, OTHER)
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        if type(value) is bytes:
+            value = value.decode(encoding='utf-8')
+            self._data[key] = value
+        return value
+
+    def get(self, key, default=None):
+        data = self._data
+        if key not in data:
+            return default
+        value = data[key]
+        if type(value) is bytes:
+            value = value.decode(encoding='utf-8')
+            data[key] = value
+        return value
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f"Event({dict(self.items())!r})"
 
     @property
     def unit(self) -> typing.Optional[str]:
@@ -22,47 +90,47 @@ class Event(dict):
 
     @property
     def unit_born(self) -> bool:
-        return self._event == 'NNet.Replay.Tracker.SUnitBornEvent'
+        return self.kind == UNIT_BORN
 
     @property
     def unit_init(self) -> bool:
-        return self._event == 'NNet.Replay.Tracker.SUnitInitEvent'
+        return self.kind == UNIT_INIT
 
     @property
     def unit_done(self) -> bool:
-        return self._event == 'NNet.Replay.Tracker.SUnitDoneEvent'
+        return self.kind == UNIT_DONE
 
     @property
     def unit_died(self) -> bool:
-        return self._event == 'NNet.Replay.Tracker.SUnitDiedEvent'
+        return self.kind == UNIT_DIED
 
     @property
     def stats_update(self) -> bool:
-        return self._event == "NNet.Replay.Tracker.SPlayerStatsEvent"
+        return self.kind == STATS_UPDATE
 
     @property
     def time_event(self) -> bool:
-        return self._event == "NNet.Game.SSetSyncLoadingTimeEvent"
+        return self.kind == TIME_EVENT
 
     @property
     def player_setup(self) -> bool:
-        return self._event == "NNet.Replay.Tracker.SPlayerSetupEvent"
+        return self.kind == PLAYER_SETUP
 
     @property
     def upgrade_event(self) -> bool:
-        return self._event == 'NNet.Replay.Tracker.SUpgradeEvent'
+        return self.kind == UPGRADE_EVENT
 
     @property
     def unit_owner_transferred(self) -> bool:
-        return self._event == 'NNet.Replay.Tracker.SUnitOwnerChangeEvent'
+        return self.kind == UNIT_OWNER_TRANSFERRED
 
     @property
     def unit_type_changed(self) -> bool:
-        return self._event == 'NNet.Replay.Tracker.SUnitTypeChangeEvent'
+        return self.kind == UNIT_TYPE_CHANGED
 
     @property
     def message_received(self) -> bool:
-        return self._event == 'NNet.Game.SChatMessage'
+        return self.kind == MESSAGE_RECEIVED
 
     @property
     def position(self) -> typing.Optional[int]:
@@ -98,3 +166,81 @@ class Event(dict):
         unit = self.get(key)
         encoded = unit_name.encode('utf-8')
         return unit == encoded or unit == unit_name
+
+
+class EventStream:
+    """
+    A single decode of an event stream shared by any number of consumers.
+
+    Iterating an EventStream yields the raw decoded dicts. The decoder is only
+    pulled as far as the furthest consumer has read, and a decoded event is
+    buffered only until every live consumer has moved past it. A consumer that
+    starts after events have been dropped gets a fresh decode of its own.
+    """
+
+    def __init__(self, decode: typing.Callable[[], typing.Iterator[dict]]):
+        self._decode = decode
+        self._source = None
+        self._done = False
+        self._buffer = deque()
+        self._start = 0
+        self._cursors = weakref.WeakSet()
+        self._closed = False
+
+    def __iter__(self) -> typing.Iterator[dict]:
+        if self._closed:
+            return iter(())
+        if self._start > 0:
+            return iter(self._decode())
+        cursor = _StreamCursor(self)
+        self._cursors.add(cursor)
+        return cursor
+
+    def _fetch(self, position: int) -> dict:
+        while position >= self._start + len(self._buffer):
+            if self._done:
+                raise StopIteration
+            if self._source is None:
+                self._source = self._decode()
+            try:
+                self._buffer.append(next(self._source))
+            except StopIteration:
+                self._done = True
+                self._source = None
+                raise
+        return self._buffer[position - self._start]
+
+    def close(self):
+        """Stops decoding: the decoder is closed and nothing more is read, even for new consumers."""
+        # Decoders are generators; anything else just stops being pulled.
+        if hasattr(self._source, "close"):
+            self._source.close()
+        self._source = None
+        self._done = self._closed = True
+        self._start += len(self._buffer)
+        self._buffer.clear()
+
+    def _release(self):
+        slowest = min((cursor.position for cursor in self._cursors), default=None)
+        if slowest is None:
+            slowest = self._start + len(self._buffer)
+        while self._start < slowest:
+            self._buffer.popleft()
+            self._start += 1
+
+
+class _StreamCursor:
+    __slots__ = ('_stream', 'position', '__weakref__')
+
+    def __init__(self, stream: EventStream):
+        self._stream = stream
+        self.position = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> dict:
+        event = self._stream._fetch(self.position)
+        self.position += 1
+        self._stream._release()
+        return event
@@ -0,0 +1,170 @@
+import itertools, os, time, typing
+from urllib.parse import quote
+
+from records import GameRecord
+
+
+# Columns of each exported table. "category" columns are dictionary-encoded
+# strings; patch and gamemode are not stored in the files, they are the
+# patch=<patch>/gamemode=<gamemode> directories each file is written under.
+TABLES = {
+    "games": (("game_id", "int64"), ("creeps", "category"), ("end_wave", "int16")),
+    "players": (("game_id", "int64"), ("player_id", "int8"), ("handle", "category"), ("name", "string"),
+                ("team", "category"), ("won", "bool")),
+    "towers": (("game_id", "int64"), ("player_id", "int8"), ("handle", "category"), ("type", "category"),
+               ("wave", "int16"), ("x", "float32"), ("y", "float32")),
+    "sends": (("game_id", "int64"), ("player_id", "int8"), ("handle", "category"), ("type", "category"),
+              ("wave", "int16")),
+    "builders": (("game_id", "int64"), ("player_id", "int8"), ("handle", "category"), ("type", "category"),
+                 ("wave", "int16")),
+    "workers": (("game_id", "int64"), ("player_id", "int8"), ("handle", "category"), ("number", "int16"),
+                ("wave", "int16")),
+    "upgrades": (("game_id", "int64"), ("player_id", "int8"), ("handle", "category"), ("number", "int16"),
+                 ("wave", "int16")),
+}
+
+
+# Games per set of files. Each flush writes a file per table and partition, so
+# small batches leave the dataset with many tiny files.
+EXPORT_BATCH = 1000
+
+
+def _pyarrow():
+    try:
+        import pyarrow, pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow: pip install pyarrow") from None
+    return pyarrow
+
+
+def rows(game: GameRecord) -> typing.Iterator[typing.Tuple[str, tuple]]:
+    """(table, row) pairs for one game, with columns in TABLES order."""
+    game_id = game['id']
+    handles = {player['player_id']: player['handle'] for player in game['players']}
+
+    yield "games", (game_id, game['creeps'], game['end_wave'])
+    for player in game['players']:
+        yield "players", (game_id, player['player_id'], player['handle'], player['name'], player['team'],
+                          bool(player['won']))
+    for tower in game['towers']:
+        yield "towers", (game_id, tower['builder'], handles.get(tower['builder']), tower['type'], tower['wave'],
+                         tower['posx'], tower['posy'])
+    for send in game['sends']:
+        yield "sends", (game_id, send['player'], handles.get(send['player']), send['type'], send['wave'])
+    for builder in game['buildersByWave']:
+        yield "builders", (game_id, builder['player'], handles.get(builder['player']), builder['type'],
+                           builder['wave'])
+    for worker in game['workers']:
+        yield "workers", (game_id, worker['player'], handles.get(worker['player']), worker['number'], worker['wave'])
+    for upgrade in game['upgrades']:
+        yield "upgrades", (game_id, upgrade['player'], handles.get(upgrade['player']), upgrade['number'],
+                           upgrade['wave'])
+
+
+class ParquetExporter:
+    """
+    Writes parsed games to a Parquet dataset for offline analytics, one
+    directory per table, partitioned hive-style by patch and gamemode:
+
+        <directory>/towers/patch=8.14/gamemode=Chaos/part-....parquet
+
+    Games are buffered and every flush() adds new files next to the existing
+    ones, so the dataset can be appended to from the ingest loop. The caller
+    decides when to flush; full is set once batch_games games are waiting.
+    Files are written under a dot-prefixed name and renamed into place, so
+    readers never see a partial file.
+    """
+
+    def __init__(self, directory, compression="zstd", batch_games=EXPORT_BATCH):
+        self.pa = _pyarrow()
+        self.directory = os.path.abspath(str(directory))
+        self.compression = compression
+        self.batch_games = batch_games
+        self._rows = {}
+        self._games = 0
+        self._sequence = itertools.count()
+        self._schemas = {table: self._schema(columns) for table, columns in TABLES.items()}
+
+    def _schema(self, columns):
+        pa = self.pa
+        types = {
+            "category": pa.dictionary(pa.int32(), pa.string()),
+            "string": pa.string(),
+            "bool": pa.bool_(),
+            "int8": pa.int8(),
+            "int16": pa.int16(),
+            "int64": pa.int64(),
+            "float32": pa.float32(),
+        }
+        return pa.schema([(name, types[kind]) for name, kind in columns])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def pending(self) -> int:
+        return self._games
+
+    @property
+    def full(self) -> bool:
+        return self._games >= self.batch_games
+
+    def add(self, game: GameRecord):
+        partition = (game['patch'], game['gamemode'])
+        for table, row in rows(game):
+            self._rows.setdefault((table, partition), []).append(row)
+        self._games += 1
+
+    def flush(self):
+        """Writes one file per table and partition for every buffered game."""
+        pa, pq = self.pa, self.pa.parquet
+        stamp = f"{time.time_ns() // 1000000}-{os.getpid()}"
+        for (table, (patch, gamemode)), buffered in self._rows.items():
+            schema = self._schemas[table]
+            columns = [
+                pa.array(values, type=field.type.value_type).dictionary_encode()
+                if pa.types.is_dictionary(field.type) else pa.array(values, type=field.type)
+                for field, values in zip(schema, zip(*buffered))
+            ]
+            directory = os.path.join(self.directory, table, f"patch={quote(patch, safe='')}",
+                                     f"gamemode={quote(gamemode, safe='')}")
+            os.makedirs(directory, exist_ok=True)
+            name = f"part-{stamp}-{next(self._sequence):05d}.parquet"
+            temp = os.path.join(directory, "." + name)
+            pq.write_table(pa.Table.from_arrays(columns, schema=schema), temp, compression=self.compression)
+            os.replace(temp, os.path.join(directory, name))
+        self._rows.clear()
+        self._games = 0
+
+    def close(self):
+        self.flush()
+
+
+def export_games(games: typing.Iterable[GameRecord], exporter: ParquetExporter) -> int:
+    """Exports games a batch at a time, for games stored before --export was used. Returns how many."""
+    count = 0
+    for game in games:
+        exporter.add(game)
+        count += 1
+        if exporter.full:
+            exporter.flush()
+    exporter.flush()
+    return count
+
+
+def dataset(directory, table: str):
+    """
+    Opens one exported table as a pyarrow dataset, with patch and gamemode
+    as columns. Each file has its own dictionaries, so call
+    .to_table().unify_dictionaries() before grouping on a category column.
+    """
+    pa = _pyarrow()
+    import pyarrow.dataset
+    # Declared rather than inferred, so a patch like "8.10" stays a string.
+    partitioning = pyarrow.dataset.partitioning(
+        pa.schema([("patch", pa.string()), ("gamemode", pa.string())]), flavor="hive"
+    )
+    return pyarrow.dataset.dataset(os.path.join(str(directory), table), format="parquet", partitioning=partitioning)
@@ -0,0 +1,89 @@
+import hashlib, os, sqlite3, typing
+
+
+STATUS_OK = "OK"
+STATUS_DUPLICATE = "Duplicate Game"
+
+HASH_CHUNK = 1 << 20
+
+
+class IndexEntry(typing.NamedTuple):
+    path: str
+    size: int
+    mtime: int
+    hash: str
+
+
+def file_hash(path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def stat_entry(path) -> IndexEntry:
+    """An IndexEntry for path without its hash, for IngestIndex.unchanged()."""
+    path = os.path.abspath(str(path))
+    stat = os.stat(path)
+    return IndexEntry(path, stat.st_size, stat.st_mtime_ns, None)
+
+
+class IngestIndex:
+    """
+    Remembers every replay file that has been looked at, keyed by path, size,
+    mtime and content hash, along with the game ID and the outcome of parsing
+    it. Unchanged files are skipped before the MPQ is ever opened.
+
+    Writes share the caller's connection and are committed with the next
+    BulkWriter flush, so an index row never outlives the game rows it refers to.
+    """
+
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    def lookup(self, path) -> typing.Optional[IndexEntry]:
+        """
+        Returns None if the file has been processed before, otherwise an
+        IndexEntry to pass to record() once the file has been parsed.
+        """
+        entry = stat_entry(path)
+        if self.unchanged(entry):
+            return None
+        entry = entry._replace(hash=file_hash(entry.path))
+        if self.reuse(entry):
+            return None
+        return entry
+
+    # lookup() in two halves that only query, for callers that stat and hash the file elsewhere.
+
+    def unchanged(self, entry: IndexEntry) -> bool:
+        """True if the file at entry.path was processed before with the same size and mtime."""
+        row = self.db.execute("SELECT SIZE, MTIME FROM IngestIndex WHERE PATH = ?", (entry.path,)).fetchone()
+        return row is not None and row[0] == entry.size and row[1] == entry.mtime
+
+    def reuse(self, entry: IndexEntry) -> bool:
+        """
+        Records a hashed entry with the outcome of an earlier file with the
+        same content, under a new path or a new mtime. True if there was one.
+        """
+        known = self.db.execute(
+            "SELECT GAME_ID, STATUS, BUILD FROM IngestIndex WHERE HASH = ? LIMIT 1", (entry.hash,)
+        ).fetchone()
+        if known is None:
+            return False
+        self.record(entry, known[0], known[1], known[2])
+        return True
+
+    def record(self, entry: IndexEntry, game_id, status: str, build: int = None):
+        self.db.execute(
+            "INSERT OR REPLACE INTO IngestIndex(PATH, SIZE, MTIME, HASH, GAME_ID, STATUS, BUILD) VALUES(?,?,?,?,?,?,?)",
+            (entry.path, entry.size, entry.mtime, entry.hash, game_id, status, build)
+        )
+
+    def common_builds(self, limit: int) -> typing.List[int]:
+        """The replay builds seen most often so far, most common first."""
+        return [row[0] for row in self.db.execute(
+            "SELECT BUILD FROM IngestIndex WHERE BUILD IS NOT NULL GROUP BY BUILD ORDER BY COUNT(*) DESC LIMIT ?",
+            (limit,)
+        )]
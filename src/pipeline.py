@@ -0,0 +1,279 @@
+import asyncio, contextlib, os, signal, time, typing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from cache import SummaryCache
+from ingest_index import IndexEntry, file_hash, stat_entry
+from profiler import NULL_PROFILER
+from screen import RejectionHistogram
+from sqreplay import WORKER_WARM_BUILDS, parse_file, store_result, warm_protocols
+from store import Store
+from watch import REPLAY_EXTENSION
+
+# Paths listed per trip to the discovery thread.
+DISCOVER_BATCH = 64
+# Parsed replays written per trip to the writer thread.
+WRITE_BATCH = 32
+
+
+class StageCounter:
+    """Items a pipeline stage has handled, the time it spent busy, and its queue's high-water mark."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.peak_queue = 0
+        self.start = None
+        self.end = None
+
+    def add(self, items: int, seconds: float):
+        now = time.perf_counter()
+        if self.start is None:
+            self.start = now - seconds
+        self.end = now
+        self.items += items
+        self.busy += seconds
+
+    def queued(self, queue: asyncio.Queue):
+        self.peak_queue = max(self.peak_queue, queue.qsize())
+
+    @property
+    def rate(self) -> float:
+        """Items per second between the stage's first and last item."""
+        if self.start is None or self.end <= self.start:
+            return 0.0
+        return self.items / (self.end - self.start)
+
+
+def replays_under(root) -> typing.Iterator[str]:
+    """Every replay below root, found lazily so discovery can stop at any point."""
+    for directory, _, names in os.walk(str(root)):
+        for name in names:
+            if name.endswith(REPLAY_EXTENSION):
+                yield os.path.join(directory, name)
+
+
+def _next_batch(paths: typing.Iterator[str], size: int) -> typing.List[str]:
+    batch = []
+    for path in paths:
+        batch.append(path)
+        if len(batch) == size:
+            break
+    return batch
+
+
+def _init_worker(builds):
+    # Ctrl-C goes to the whole process group; the pipeline decides what stops, so the
+    # workers ignore it and finish the replay they have.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    warm_protocols(builds)
+
+
+@contextlib.contextmanager
+def cancel_on_interrupt(task: asyncio.Task):
+    """
+    Makes every Ctrl-C inside the block cancel task. asyncio.run() turns the
+    second one into KeyboardInterrupt, which would skip Pipeline.run()'s
+    drain; a cancel, however often repeated, only winds the pipeline down.
+    """
+    loop = asyncio.get_running_loop()
+
+    def interrupt(signum, frame):
+        loop.call_soon_threadsafe(lambda: task.done() or task.cancel())
+
+    previous = signal.signal(signal.SIGINT, interrupt)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGINT, previous)
+
+
+class Pipeline:
+    """
+    Ingests a Starcraft II folder as three stages joined by bounded queues:
+
+      discover  walks the folder in a thread, a batch at a time
+      decode    parses replays in a process pool, `workers` at a time
+      write     one thread owns the Store and writes parsed replays in batches
+
+    A full queue blocks the stage feeding it, so a folder that lists faster
+    than replays decode never holds more than queue_size paths and
+    queue_size parsed games in memory.
+
+    stop(), or cancelling run(), stops discovery and drops queued paths, but
+    replays already being decoded are finished and written and the last batch
+    is flushed. Skipped replays are not in the ingest index yet, so the next
+    run picks them up. Run it inside cancel_on_interrupt() for Ctrl-C to do
+    the same.
+    """
+
+    def __init__(self, open_store: typing.Callable[[], Store], workers: int, queue_size=64, debug=False,
+                 cache: SummaryCache = None, profiler=NULL_PROFILER, rejections: RejectionHistogram = None,
+                 full_scan=False):
+        self.open_store = open_store
+        self.workers = workers
+        self.queue_size = queue_size
+        self.debug = debug
+        self.cache = cache
+        self.profiler = profiler
+        self.rejections = rejections
+        self.full_scan = full_scan
+
+        self.counters = {name: StageCounter(name) for name in ("discover", "decode", "write")}
+        self.skipped = 0
+        self.added = 0
+        self._stopping = False
+        self._store = None
+        self._writer = None
+
+    def stop(self):
+        """Asks the pipeline to wind down: no new replays are started."""
+        self._stopping = True
+
+    async def _db(self, function, *args):
+        """Runs function on the writer thread, the only thread that touches the Store."""
+        return await asyncio.get_running_loop().run_in_executor(self._writer, function, *args)
+
+    async def run(self, root):
+        loop = asyncio.get_running_loop()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline-writer")
+        paths = asyncio.Queue(self.queue_size)
+        parsed = asyncio.Queue(self.queue_size)
+        # A few more decoders than processes, so the pool never waits on the index lookup.
+        decoders = self.workers * 2
+
+        try:
+            self._store = await self._db(self.open_store)
+            builds = await self._db(self._store.index.common_builds, WORKER_WARM_BUILDS)
+            with ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(builds,)) as pool:
+                writer = asyncio.create_task(self._write(parsed))
+                decoding = [asyncio.create_task(self._decode(pool, paths, parsed)) for _ in range(decoders)]
+                discovery = asyncio.create_task(self._discover(root, paths))
+                try:
+                    await discovery
+                except asyncio.CancelledError:
+                    self._wind_down(discovery)
+
+                # In-flight replays are finished and written even if cancelled again meanwhile.
+                drain = asyncio.ensure_future(self._drain(decoding, writer, paths, parsed))
+                while not drain.done():
+                    try:
+                        await asyncio.shield(drain)
+                    except asyncio.CancelledError:
+                        self._wind_down(discovery)
+                drain.result()
+        finally:
+            if self._store is not None:
+                await loop.run_in_executor(self._writer, self._store.close)
+            self._writer.shutdown()
+
+    def _wind_down(self, discovery: asyncio.Task):
+        # Decoders drop the paths still queued once stopping, so nothing needs draining here.
+        self.stop()
+        discovery.cancel()
+
+    async def _drain(self, decoding: list, writer: asyncio.Task, paths: asyncio.Queue, parsed: asyncio.Queue):
+        """Lets every decoder finish, then the writer, which flushes its last batch."""
+        for _ in decoding:
+            await paths.put(None)
+        await asyncio.gather(*decoding)
+        await parsed.put(None)
+        await writer
+
+    async def _discover(self, root, paths: asyncio.Queue):
+        counter = self.counters["discover"]
+        found = replays_under(root)
+        while not self._stopping:
+            start = time.perf_counter()
+            batch = await asyncio.to_thread(_next_batch, found, DISCOVER_BATCH)
+            if not batch:
+                return
+            counter.add(len(batch), time.perf_counter() - start)
+            for path in batch:
+                await paths.put(path)
+                counter.queued(paths)
+
+    async def _decode(self, pool: ProcessPoolExecutor, paths: asyncio.Queue, parsed: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        counter = self.counters["decode"]
+        dump = self.profiler.dump if self.profiler.enabled else None
+        while True:
+            path = await paths.get()
+            if path is None:
+                return
+            if self._stopping:
+                continue
+
+            try:
+                entry = await self._lookup(path)
+            except OSError as e:
+                # Gone or unreadable since it was listed; there is nothing to index it by.
+                if self.debug:
+                    print(f"Cannot read replay: {path} ({e})".encode('utf-8'))
+                continue
+            if entry is None:
+                self.skipped += 1
+                if self.debug:
+                    print(f"Replay unchanged since last run: {path}")
+                continue
+
+            start = time.perf_counter()
+            result = await loop.run_in_executor(pool, parse_file,
+                                                (entry.path, self.debug, self.cache, dump, self.full_scan, entry.hash))
+            counter.add(1, time.perf_counter() - start)
+            await parsed.put((entry, result))
+            counter.queued(parsed)
+
+    async def _lookup(self, path) -> typing.Optional[IndexEntry]:
+        """IngestIndex.lookup(), with the stat and hash in a thread so the writer thread only runs the queries."""
+        entry = await asyncio.to_thread(stat_entry, path)
+        if await self._db(self._store.index.unchanged, entry):
+            return None
+        entry = entry._replace(hash=await asyncio.to_thread(file_hash, entry.path))
+        if await self._db(self._store.index.reuse, entry):
+            return None
+        return entry
+
+    async def _write(self, parsed: asyncio.Queue):
+        counter = self.counters["write"]
+        done = False
+        while not done:
+            batch = [await parsed.get()]
+            while len(batch) < WRITE_BATCH and not parsed.empty():
+                batch.append(parsed.get_nowait())
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+
+            start = time.perf_counter()
+            await self._db(self._write_batch, batch, done)
+            counter.add(len(batch), time.perf_counter() - start)
+
+    def _write_batch(self, batch: list, flush: bool):
+        for entry, result in batch:
+            if store_result(self._store, entry, result, self.debug, self.profiler, self.rejections):
+                self.added += 1
+        if flush:
+            with self.profiler.stage("write"):
+                self._store.flush()
+
+    def print_summary(self):
+        print(f"\n{self.added} games added, {self.skipped} replays unchanged"
+              + (", stopped early" if self._stopping else ""))
+        print(f"{'stage':<10}{'items':>10}{'busy s':>10}{'per s':>10}{'peak queue':>12}")
+        for counter in self.counters.values():
+            print(f"{counter.name:<10}{counter.items:>10}{counter.busy:>10.2f}{counter.rate:>10.1f}"
+                  f"{counter.peak_queue:>12}")
+
+
+async def ingest_async(root, open_store: typing.Callable[[], Store], workers: int, queue_size=64, debug=False,
+                       cache: SummaryCache = None, profiler=NULL_PROFILER, rejections: RejectionHistogram = None,
+                       full_scan=False) -> Pipeline:
+    """Runs a Pipeline over root until it is done or cancelled, and returns it for its counters."""
+    pipeline = Pipeline(open_store, workers, queue_size, debug, cache, profiler, rejections, full_scan)
+    try:
+        await pipeline.run(root)
+    except asyncio.CancelledError:
+        # run() has already wound down; a cancel is a normal way to end a service run.
+        pass
+    return pipeline
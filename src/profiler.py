@@ -0,0 +1,220 @@
+import cProfile, contextlib, csv, heapq, json, marshal, os, time, typing
+
+
+# Report order; any other stage name is listed after these.
+STAGES = ("mpq", "decode", "cache", "handle", "write")
+
+
+class _NullContext:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_CONTEXT = _NullContext()
+
+
+class NullProfiler:
+    """Used when --profile is off. Every hook is a constant no-op."""
+
+    enabled = False
+
+    def replay(self, file, record=None, stats=None):
+        return _NULL_CONTEXT
+
+    def stage(self, name):
+        return _NULL_CONTEXT
+
+    def iterate(self, name, iterable, count=False):
+        return iterable
+
+    def add_bytes(self, size):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def _new_record(file) -> dict:
+    return {'file': str(file), 'wall': 0.0, 'cpu': 0.0, 'events': 0, 'bytes': 0, 'stages': {}}
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(round(q / 100.0 * len(values) + 0.5)) - 1))
+    return values[rank]
+
+
+class Profiler:
+    """
+    Records wall and CPU time per ingest stage for every replay, plus the
+    tracker events decoded and the bytes read from the MPQ.
+
+    Stages nest, and time is charged to the innermost one only: s2protocol
+    time spent inside the read() loop counts as "decode", not "handle".
+    Stages entered outside a replay are charged to the run as a whole.
+    With dump > 0 each replay also runs under cProfile and the profiles of
+    the `dump` slowest replays are kept for dump_profiles().
+    """
+
+    enabled = True
+
+    def __init__(self, dump=0):
+        self.dump = dump
+        self.records = []
+        self.run = _new_record("<run>")
+        self._current = self.run
+        self._stack = []
+        self._slowest = []
+        self._sequence = 0
+
+    @contextlib.contextmanager
+    def replay(self, file, record=None, stats=None):
+        """
+        Profiles one replay. Pass the record (and cProfile stats) returned by
+        a worker's profiler to keep adding to it in this process.
+        """
+        continued = record is not None
+        record = record if continued else _new_record(file)
+        outer, stack = self._current, self._stack
+        self._current, self._stack = record, []
+
+        # A record continued from a worker already carries that worker's cProfile stats.
+        profile = cProfile.Profile() if self.dump and not continued else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile is not None:
+                profile.disable()
+            record['wall'] += time.perf_counter() - wall
+            record['cpu'] += time.process_time() - cpu
+            self._current, self._stack = outer, stack
+            self.records.append(record)
+
+            if profile is not None:
+                profile.create_stats()
+                stats = stats or {}
+                stats.update(profile.stats)
+            if stats:
+                self._keep(record, stats)
+
+    def _keep(self, record: dict, stats: dict):
+        self._sequence += 1
+        entry = (record['wall'], self._sequence, record['file'], marshal.dumps(stats))
+        if len(self._slowest) < self.dump:
+            heapq.heappush(self._slowest, entry)
+        elif entry[0] > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def profile_stats(self, record: dict) -> typing.Optional[dict]:
+        """The cProfile stats of a record if it is among the slowest so far, for sending across processes."""
+        for wall, _, file, data in self._slowest:
+            if file == record['file']:
+                return marshal.loads(data)
+        return None
+
+    def _charge(self, now):
+        name, wall, cpu = self._stack[-1]
+        totals = self._current['stages'].setdefault(name, [0.0, 0.0])
+        totals[0] += now[0] - wall
+        totals[1] += now[1] - cpu
+        self._stack[-1] = (name, now[0], now[1])
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        now = (time.perf_counter(), time.process_time())
+        if self._stack:
+            self._charge(now)
+        self._stack.append((name, now[0], now[1]))
+        try:
+            yield
+        finally:
+            now = (time.perf_counter(), time.process_time())
+            self._charge(now)
+            self._stack.pop()
+            if self._stack:
+                parent = self._stack[-1][0]
+                self._stack[-1] = (parent, now[0], now[1])
+
+    def iterate(self, name, iterable, count=False):
+        """Charges the time spent producing each item to `name`, counting items as events if asked."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            if count:
+                self._current['events'] += 1
+            yield item
+
+    def add_bytes(self, size):
+        self._current['bytes'] += size
+
+    def summary(self) -> dict:
+        names = list(STAGES) + sorted({s for r in self.records for s in r['stages']} - set(STAGES))
+        series = {name: sorted(r['stages'].get(name, (0.0, 0.0))[0] for r in self.records) for name in names}
+        series['total'] = sorted(r['wall'] for r in self.records)
+
+        stages = {}
+        for name, values in series.items():
+            cpu = sum(r['cpu'] if name == 'total' else r['stages'].get(name, (0.0, 0.0))[1] for r in self.records)
+            stages[name] = {
+                'wall': sum(values),
+                'cpu': cpu,
+                'p50': percentile(values, 50),
+                'p90': percentile(values, 90),
+                'p99': percentile(values, 99),
+                'max': values[-1] if values else 0.0,
+            }
+
+        return {
+            'replays': len(self.records),
+            'events': sum(r['events'] for r in self.records),
+            'bytes': sum(r['bytes'] for r in self.records),
+            'stages': stages,
+            'run': self.run['stages'],
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"\n{summary['replays']} replays, {summary['events']} tracker events, "
+              f"{summary['bytes'] / (1 << 20):.1f} MiB read")
+        print(f"{'stage':<8}{'wall s':>10}{'cpu s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for name, s in summary['stages'].items():
+            print(f"{name:<8}{s['wall']:>10.2f}{s['cpu']:>10.2f}{s['p50'] * 1000:>10.1f}"
+                  f"{s['p90'] * 1000:>10.1f}{s['p99'] * 1000:>10.1f}{s['max'] * 1000:>10.1f}")
+        for name, (wall, cpu) in summary['run'].items():
+            print(f"{name + '*':<8}{wall:>10.2f}{cpu:>10.2f}")
+
+    def write(self, prefix: str):
+        """Writes <prefix>.json (summary and every record) and <prefix>.csv (one row per replay)."""
+        with open(prefix + ".json", "w") as f:
+            json.dump({'summary': self.summary(), 'replays': self.records}, f, indent=4)
+
+        names = list(STAGES) + sorted({s for r in self.records for s in r['stages']} - set(STAGES))
+        with open(prefix + ".csv", "w", newline="") as f:
+            out = csv.writer(f)
+            out.writerow(['file', 'wall', 'cpu', 'events', 'bytes'] +
+                         [f"{name}_{kind}" for name in names for kind in ('wall', 'cpu')])
+            for r in self.records:
+                out.writerow([r['file'], r['wall'], r['cpu'], r['events'], r['bytes']] +
+                             [v for name in names for v in r['stages'].get(name, (0.0, 0.0))])
+
+    def dump_profiles(self, directory: str):
+        """Writes the cProfile stats of the slowest replays, loadable with pstats.Stats(path)."""
+        os.makedirs(directory, exist_ok=True)
+        for rank, (wall, _, file, data) in enumerate(sorted(self._slowest, reverse=True), start=1):
+            name = os.path.splitext(os.path.basename(file))[0]
+            with open(os.path.join(directory, f"{rank:03d}-{name}.prof"), "wb") as f:
+                f.write(data)
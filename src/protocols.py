@@ -0,0 +1,70 @@
+import bisect, re, threading, typing
+
+PROTOCOL_FILE = re.compile(r'protocol(\d+)\.py$')
+
+
+class ProtocolRegistry:
+    """
+    Process-wide cache of s2protocol protocol modules. Each build module is
+    imported once, and replays from builds s2protocol does not ship fall back
+    to the nearest lower build with a bisect over the sorted build numbers.
+
+    `versions` is the s2protocol.versions module (or a stand-in with the same
+    list_all() and build()); it is imported on first use.
+    """
+
+    def __init__(self, versions=None):
+        self._versions = versions
+        self._builds = None
+        self._modules = {}
+        self._lock = threading.Lock()
+
+    @property
+    def versions(self):
+        if self._versions is None:
+            from s2protocol import versions
+            self._versions = versions
+        return self._versions
+
+    @property
+    def builds(self) -> typing.List[int]:
+        """Every build s2protocol has a protocol module for, ascending."""
+        if self._builds is None:
+            self._builds = sorted({
+                int(match.group(1)) for match in map(PROTOCOL_FILE.search, self.versions.list_all()) if match
+            })
+        return self._builds
+
+    def closest(self, build: int) -> int:
+        """The build itself if it is known, else the nearest lower one."""
+        builds = self.builds
+        i = bisect.bisect_right(builds, build)
+        # Older than anything s2protocol ships: use the newest, as the old lookup did.
+        return builds[i - 1] if i else builds[-1]
+
+    def module(self, build: int):
+        """The protocol module for an exact build, imported on first use."""
+        protocol = self._modules.get(build)
+        if protocol is None:
+            # s2protocol imports through `imp`, which is not safe to race.
+            with self._lock:
+                protocol = self._modules.get(build)
+                if protocol is None:
+                    protocol = self.versions.build(build)
+                    self._modules[build] = protocol
+        return protocol
+
+    def latest(self):
+        return self.module(self.builds[-1])
+
+    def for_build(self, build: int):
+        return self.module(self.closest(build))
+
+    def warm(self, builds: typing.Iterable[int]):
+        """Imports the protocols for `builds` (and the header decoder) ahead of time."""
+        self.latest()
+        for build in builds:
+            self.for_build(build)
+
+
+PROTOCOLS = ProtocolRegistry()
@@ -0,0 +1,231 @@
+import collections, contextlib, os, queue, sqlite3, threading, time, typing
+from pathlib import Path
+
+
+class ModeRecord(typing.NamedTuple):
+    gamemode: str
+    patch: str
+    games: int
+    wins: int
+
+
+class TowerUsage(typing.NamedTuple):
+    tower: str
+    towers: int
+
+
+class PlayerProfile(typing.NamedTuple):
+    handle: str
+    name: str
+    latest_game: int
+    games: int
+    wins: int
+    records: typing.List[ModeRecord]
+    towers: typing.List[TowerUsage]
+
+
+class Match(typing.NamedTuple):
+    game_id: int
+    patch: str
+    gamemode: str
+    creeps: str
+    end_wave: int
+    player_id: int
+    team: str
+    won: bool
+
+
+class TowerPick(typing.NamedTuple):
+    tower: str
+    towers: int
+    players: int
+
+
+class LeaderboardEntry(typing.NamedTuple):
+    rank: int
+    handle: str
+    name: str
+    games: int
+    wins: int
+    win_rate: float
+
+
+class ConnectionPool:
+    """
+    Read-only connections to one database, opened on demand up to `size` and
+    handed to one thread at a time. With the database in WAL mode readers see
+    the last committed state and never block the ingest writer.
+    """
+
+    def __init__(self, path, size=4):
+        self.uri = Path(os.path.abspath(str(path))).as_uri() + "?mode=ro"
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def open(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        db.execute("PRAGMA busy_timeout = 5000")
+        return db
+
+    @contextlib.contextmanager
+    def connection(self):
+        try:
+            db = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                opened = self._opened < self.size
+                if opened:
+                    self._opened += 1
+            db = self.open() if opened else self._idle.get()
+        try:
+            yield db
+        finally:
+            self._idle.put(db)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class ResultCache:
+    """
+    LRU cache of query results that also drops entries older than `ttl`
+    seconds. clear() is called whenever the database has changed.
+    """
+
+    def __init__(self, max_entries=1024, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns (True, value) on a hit and (False, None) on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class Stats:
+    """
+    Typed read-only queries for the stats front end. Results are cached until
+    they expire or any other connection, such as a running ingest, commits to
+    the database.
+    """
+
+    def __init__(self, path, pool_size=4, cache_size=1024, ttl=30.0):
+        self.pool = ConnectionPool(path, pool_size)
+        self.cache = ResultCache(cache_size, ttl)
+        # PRAGMA data_version on a connection that never writes changes
+        # exactly when another connection has committed.
+        self._watch = self.pool.open()
+        self._watch_lock = threading.Lock()
+        self._data_version = None
+
+    def close(self):
+        self.pool.close()
+        self._watch.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _check_version(self):
+        with self._watch_lock:
+            version = self._watch.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._data_version:
+                self._data_version = version
+                self.cache.clear()
+
+    def _cached(self, key, run):
+        self._check_version()
+        hit, value = self.cache.get(key)
+        if hit:
+            return value
+        with self.pool.connection() as db:
+            value = run(db)
+        self.cache.put(key, value)
+        return value
+
+    def player_profile(self, handle: str) -> typing.Optional[PlayerProfile]:
+        def run(db):
+            player = db.execute("SELECT NAME, LATEST_GAME FROM Players WHERE HANDLE = ?", (handle,)).fetchone()
+            if player is None:
+                return None
+            records = [ModeRecord(*row) for row in db.execute(
+                "SELECT GAMEMODE, PATCH, GAMES, WINS FROM PlayerStats WHERE HANDLE = ? ORDER BY PATCH DESC, GAMEMODE",
+                (handle,)
+            )]
+            towers = [TowerUsage(*row) for row in db.execute(
+                """SELECT tt.NAME, SUM(s.TOWERS) FROM PlayerTowerStats s JOIN TowerTypes tt ON tt.ID = s.TOWER_TYPE_ID
+                   WHERE s.HANDLE = ? GROUP BY tt.NAME ORDER BY 2 DESC, 1 LIMIT 10""",
+                (handle,)
+            )]
+            return PlayerProfile(handle, player[0], player[1], sum(r.games for r in records),
+                                 sum(r.wins for r in records), records, towers)
+        return self._cached(("player_profile", handle), run)
+
+    def match_history(self, handle: str, limit=20, before: int = None) -> typing.List[Match]:
+        """Most recent games first. Pass the last game_id seen as `before` for the next page."""
+        def run(db):
+            return [Match(row[0], row[1], row[2], row[3], row[4], row[5], row[6], bool(row[7])) for row in db.execute(
+                """SELECT g.ID, g.PATCH, g.GAMEMODE, g.CREEPS, g.END, gp.PLAYER_ID, gp.TEAM, gp.WON
+                   FROM GamePlayers gp JOIN Games g ON g.ID = gp.GAME_ID
+                   WHERE gp.PLAYER_HANDLE = ? AND gp.GAME_ID < ? ORDER BY gp.GAME_ID DESC LIMIT ?""",
+                (handle, before if before is not None else 2 ** 63 - 1, limit)
+            )]
+        return self._cached(("match_history", handle, limit, before), run)
+
+    def tower_meta(self, patch: str) -> typing.List[TowerPick]:
+        """How often each tower was built on a patch, and by how many players."""
+        def run(db):
+            return [TowerPick(*row) for row in db.execute(
+                """SELECT tt.NAME, SUM(s.TOWERS), COUNT(DISTINCT s.HANDLE)
+                   FROM PlayerTowerStats s JOIN TowerTypes tt ON tt.ID = s.TOWER_TYPE_ID
+                   WHERE s.PATCH = ? GROUP BY tt.NAME ORDER BY 2 DESC, 1""",
+                (patch,)
+            )]
+        return self._cached(("tower_meta", patch), run)
+
+    def leaderboard(self, patch: str = None, gamemode: str = None, min_games=10, limit=50) -> typing.List[LeaderboardEntry]:
+        """Players ranked by win rate, then by games played."""
+        def run(db):
+            rows = db.execute(
+                """SELECT s.HANDLE, p.NAME, SUM(s.GAMES), SUM(s.WINS)
+                   FROM PlayerStats s JOIN Players p ON p.HANDLE = s.HANDLE
+                   WHERE (?1 IS NULL OR s.PATCH = ?1) AND (?2 IS NULL OR s.GAMEMODE = ?2)
+                   GROUP BY s.HANDLE HAVING SUM(s.GAMES) >= ?3
+                   ORDER BY CAST(SUM(s.WINS) AS REAL) / SUM(s.GAMES) DESC, SUM(s.GAMES) DESC, s.HANDLE
+                   LIMIT ?4""",
+                (patch, gamemode, min_games, limit)
+            )
+            return [LeaderboardEntry(rank, handle, name, games, wins, wins / games)
+                    for rank, (handle, name, games, wins) in enumerate(rows, start=1)]
+        return self._cached(("leaderboard", patch, gamemode, min_games, limit), run)
@@ -0,0 +1,53 @@
+import typing
+
+
+class PlayerRecord(typing.TypedDict):
+    name: str
+    handle: str
+    user_id: typing.Optional[int]
+    player_id: typing.Optional[int]
+    color: tuple
+    team: str
+    won: bool
+
+
+class TowerRecord(typing.TypedDict):
+    builder: int
+    type: str
+    wave: int
+    posx: int
+    posy: int
+
+
+class SendRecord(typing.TypedDict):
+    player: int
+    type: str
+    wave: int
+
+
+class BuilderRecord(typing.TypedDict):
+    player: int
+    type: str
+    wave: int
+
+
+class WorkerRecord(typing.TypedDict):
+    """A worker or gas speed upgrade; number counts them per player."""
+    player: int
+    wave: int
+    number: int
+
+
+class GameRecord(typing.TypedDict):
+    """One parsed game, as returned by parse_replay() and Replay.read()."""
+    id: int
+    patch: str
+    creeps: str
+    gamemode: str
+    end_wave: int
+    players: typing.List[PlayerRecord]
+    towers: typing.List[TowerRecord]
+    sends: typing.List[SendRecord]
+    buildersByWave: typing.List[BuilderRecord]
+    workers: typing.List[WorkerRecord]
+    upgrades: typing.List[WorkerRecord]
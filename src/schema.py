@@ -0,0 +1,114 @@
+import os, sqlite3
+import stats
+
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+
+# schema.sql always describes the newest layout. Databases created before
+# PRAGMA user_version was used are version 1.
+LATEST_VERSION = 4
+
+
+def _intern_column(table: str, column: str, types: str, id_column: str) -> str:
+    """Rebuilds `table` with the text `column` replaced by an ID into `types`."""
+    return f"""
+        INSERT OR IGNORE INTO {types}(NAME) SELECT DISTINCT {column} FROM {table};
+        CREATE TABLE {table}_v2
+        (
+            WAVE INTEGER NOT NULL,
+            {id_column} INTEGER NOT NULL,
+            GAME_ID INTEGER NOT NULL,
+            HANDLE TEXT NOT NULL,
+            PLAYER_ID INTEGER NOT NULL,
+            FOREIGN KEY({id_column}) REFERENCES {types}(ID),
+            FOREIGN KEY(GAME_ID) REFERENCES Games(ID),
+            FOREIGN KEY(HANDLE) REFERENCES Players(HANDLE),
+            FOREIGN KEY(PLAYER_ID) REFERENCES GamePlayers(PLAYER_ID)
+        );
+        INSERT INTO {table}_v2(WAVE, {id_column}, GAME_ID, HANDLE, PLAYER_ID)
+            SELECT t.WAVE, n.ID, t.GAME_ID, t.HANDLE, t.PLAYER_ID
+            FROM {table} t JOIN {types} n ON n.NAME = t.{column};
+        DROP TABLE {table};
+        ALTER TABLE {table}_v2 RENAME TO {table};
+    """
+
+
+# (version, script) pairs that take a database from version - 1 to version.
+# Tables and indexes that are only added, never changed, come from schema.sql.
+MIGRATIONS = [
+    (2, """
+        CREATE TABLE IF NOT EXISTS TowerTypes(ID INTEGER PRIMARY KEY NOT NULL, NAME TEXT NOT NULL, UNIQUE(NAME));
+        CREATE TABLE IF NOT EXISTS SendTypes(ID INTEGER PRIMARY KEY NOT NULL, NAME TEXT NOT NULL, UNIQUE(NAME));
+        CREATE TABLE IF NOT EXISTS BuilderTypes(ID INTEGER PRIMARY KEY NOT NULL, NAME TEXT NOT NULL, UNIQUE(NAME));
+    """ + _intern_column("Towers", "TOWER_TYPE", "TowerTypes", "TOWER_TYPE_ID")
+        + _intern_column("Sends", "SEND_TYPE", "SendTypes", "SEND_TYPE_ID")
+        + _intern_column("Builders", "BUILDER", "BuilderTypes", "BUILDER_ID")),
+    # Older databases may predate the ingest index altogether.
+    (4, """
+        CREATE TABLE IF NOT EXISTS IngestIndex
+        (
+            PATH TEXT PRIMARY KEY NOT NULL,
+            SIZE INTEGER NOT NULL,
+            MTIME INTEGER NOT NULL,
+            HASH TEXT NOT NULL,
+            GAME_ID INTEGER,
+            STATUS TEXT NOT NULL,
+            UNIQUE(PATH)
+        );
+        ALTER TABLE IngestIndex ADD COLUMN BUILD INTEGER;
+    """),
+]
+
+
+# (version, function) pairs that fill tables added in `version` from existing
+# rows. They run after schema.sql has created those tables.
+BACKFILLS = [
+    (3, stats.rebuild),
+]
+
+
+def configure(db: sqlite3.Connection):
+    """Connection settings for ingest and stats queries."""
+    # WAL lets readers keep querying while an ingest is writing.
+    db.execute("PRAGMA journal_mode = WAL")
+    # In WAL mode NORMAL only risks the last commits on power loss, never corruption.
+    db.execute("PRAGMA synchronous = NORMAL")
+    db.execute("PRAGMA temp_store = MEMORY")
+    db.execute("PRAGMA cache_size = -65536")
+    db.execute("PRAGMA busy_timeout = 5000")
+
+
+def version(db: sqlite3.Connection) -> int:
+    current = db.execute("PRAGMA user_version").fetchone()[0]
+    if current == 0 and db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Games'").fetchone() is not None:
+        return 1
+    return current
+
+
+def upgrade(db: sqlite3.Connection):
+    """Creates a fresh database or migrates an older one to LATEST_VERSION."""
+    # Backfills are chosen by the version the database started at; the loop below moves current.
+    start = current = version(db)
+
+    if current != 0:
+        for number, script in MIGRATIONS:
+            if number <= current:
+                continue
+            # One transaction per step, so a failed migration leaves the last good version.
+            try:
+                db.executescript(f"BEGIN; {script} PRAGMA user_version = {number}; COMMIT;")
+            except sqlite3.Error:
+                if db.in_transaction:
+                    db.rollback()
+                raise
+            current = number
+
+    with open(SCHEMA_PATH, "r") as f:
+        db.executescript(f.read())
+    if start != 0:
+        for number, backfill in BACKFILLS:
+            if number > start:
+                backfill(db)
+    db.execute(f"PRAGMA user_version = {LATEST_VERSION}")
+    db.commit()
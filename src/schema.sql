@@ -27,13 +27,35 @@ CREATE TABLE IF NOT EXISTS GamePlayers
     FOREIGN KEY(GAME_ID) REFERENCES Games(ID)
 );
 
+CREATE TABLE IF NOT EXISTS TowerTypes
+(
+    ID INTEGER PRIMARY KEY NOT NULL,
+    NAME TEXT NOT NULL,
+    UNIQUE(NAME)
+);
+
+CREATE TABLE IF NOT EXISTS SendTypes
+(
+    ID INTEGER PRIMARY KEY NOT NULL,
+    NAME TEXT NOT NULL,
+    UNIQUE(NAME)
+);
+
+CREATE TABLE IF NOT EXISTS BuilderTypes
+(
+    ID INTEGER PRIMARY KEY NOT NULL,
+    NAME TEXT NOT NULL,
+    UNIQUE(NAME)
+);
+
 CREATE TABLE IF NOT EXISTS Towers
 (
     WAVE INTEGER NOT NULL,
-    TOWER_TYPE TEXT NOT NULL,
+    TOWER_TYPE_ID INTEGER NOT NULL,
     GAME_ID INTEGER NOT NULL,
     HANDLE TEXT NOT NULL,
     PLAYER_ID INTEGER NOT NULL,
+    FOREIGN KEY(TOWER_TYPE_ID) REFERENCES TowerTypes(ID),
     FOREIGN KEY(GAME_ID) REFERENCES Games(ID),
     FOREIGN KEY(HANDLE) REFERENCES Players(HANDLE),
     FOREIGN KEY(PLAYER_ID) REFERENCES GamePlayers(PLAYER_ID)
@@ -42,10 +64,11 @@ CREATE TABLE IF NOT EXISTS Towers
 CREATE TABLE IF NOT EXISTS Sends
 (
     WAVE INTEGER NOT NULL,
-    SEND_TYPE TEXT NOT NULL,
+    SEND_TYPE_ID INTEGER NOT NULL,
     GAME_ID INTEGER NOT NULL,
     HANDLE TEXT NOT NULL,
     PLAYER_ID INTEGER NOT NULL,
+    FOREIGN KEY(SEND_TYPE_ID) REFERENCES SendTypes(ID),
     FOREIGN KEY(GAME_ID) REFERENCES Games(ID),
     FOREIGN KEY(HANDLE) REFERENCES Players(HANDLE),
     FOREIGN KEY(PLAYER_ID) REFERENCES GamePlayers(PLAYER_ID)
@@ -54,10 +77,11 @@ CREATE TABLE IF NOT EXISTS Sends
 CREATE TABLE IF NOT EXISTS Builders
 (
     WAVE INTEGER NOT NULL,
-    BUILDER TEXT NOT NULL,
+    BUILDER_ID INTEGER NOT NULL,
     GAME_ID INTEGER NOT NULL,
     HANDLE TEXT NOT NULL,
     PLAYER_ID INTEGER NOT NULL,
+    FOREIGN KEY(BUILDER_ID) REFERENCES BuilderTypes(ID),
     FOREIGN KEY(GAME_ID) REFERENCES Games(ID),
     FOREIGN KEY(HANDLE) REFERENCES Players(HANDLE),
     FOREIGN KEY(PLAYER_ID) REFERENCES GamePlayers(PLAYER_ID)
@@ -85,4 +109,108 @@ CREATE TABLE IF NOT EXISTS Upgrades
     FOREIGN KEY (GAME_ID) REFERENCES Games (ID),
     FOREIGN KEY (HANDLE) REFERENCES Players (HANDLE),
     FOREIGN KEY (PLAYER_ID) REFERENCES GamePlayers (PLAYER_ID)
-);
\ No newline at end of file
+);
+
+
+CREATE TABLE IF NOT EXISTS IngestIndex
+(
+    PATH TEXT PRIMARY KEY NOT NULL,
+    SIZE INTEGER NOT NULL,
+    MTIME INTEGER NOT NULL,
+    HASH TEXT NOT NULL,
+    GAME_ID INTEGER,
+    STATUS TEXT NOT NULL,
+    BUILD INTEGER,
+    UNIQUE(PATH)
+);
+
+CREATE INDEX IF NOT EXISTS IngestIndexHash ON IngestIndex (HASH);
+
+
+-- Per-player lookups lead with HANDLE; the trailing columns let the stats queries
+-- run from the index alone. Per-game lookups and deletes use the GAME_ID indexes.
+CREATE INDEX IF NOT EXISTS GamesPatch ON Games (PATCH, GAMEMODE);
+CREATE INDEX IF NOT EXISTS GamePlayersHandle ON GamePlayers (PLAYER_HANDLE, GAME_ID, WON);
+CREATE INDEX IF NOT EXISTS GamePlayersGame ON GamePlayers (GAME_ID);
+CREATE INDEX IF NOT EXISTS TowersHandle ON Towers (HANDLE, GAME_ID, TOWER_TYPE_ID);
+CREATE INDEX IF NOT EXISTS TowersGame ON Towers (GAME_ID);
+CREATE INDEX IF NOT EXISTS SendsHandle ON Sends (HANDLE, GAME_ID, SEND_TYPE_ID);
+CREATE INDEX IF NOT EXISTS SendsGame ON Sends (GAME_ID);
+CREATE INDEX IF NOT EXISTS BuildersHandle ON Builders (HANDLE, GAME_ID, BUILDER_ID);
+CREATE INDEX IF NOT EXISTS BuildersGame ON Builders (GAME_ID);
+CREATE INDEX IF NOT EXISTS WorkersHandle ON Workers (HANDLE, GAME_ID);
+CREATE INDEX IF NOT EXISTS WorkersGame ON Workers (GAME_ID);
+CREATE INDEX IF NOT EXISTS UpgradesHandle ON Upgrades (HANDLE, GAME_ID);
+CREATE INDEX IF NOT EXISTS UpgradesGame ON Upgrades (GAME_ID);
+
+
+-- The row layout from before type interning, for ad-hoc queries.
+CREATE VIEW IF NOT EXISTS TowersNamed AS
+    SELECT t.WAVE, tt.NAME AS TOWER_TYPE, t.GAME_ID, t.HANDLE, t.PLAYER_ID
+    FROM Towers t JOIN TowerTypes tt ON tt.ID = t.TOWER_TYPE_ID;
+
+CREATE VIEW IF NOT EXISTS SendsNamed AS
+    SELECT s.WAVE, st.NAME AS SEND_TYPE, s.GAME_ID, s.HANDLE, s.PLAYER_ID
+    FROM Sends s JOIN SendTypes st ON st.ID = s.SEND_TYPE_ID;
+
+CREATE VIEW IF NOT EXISTS BuildersNamed AS
+    SELECT b.WAVE, bt.NAME AS BUILDER, b.GAME_ID, b.HANDLE, b.PLAYER_ID
+    FROM Builders b JOIN BuilderTypes bt ON bt.ID = b.BUILDER_ID;
+
+
+-- Per-player aggregates, kept up to date by stats.update() in the insert transaction.
+-- Rebuild from the raw tables with --rebuild-stats.
+CREATE TABLE IF NOT EXISTS PlayerStats
+(
+    HANDLE TEXT NOT NULL,
+    GAMEMODE TEXT NOT NULL,
+    PATCH TEXT NOT NULL,
+    GAMES INTEGER NOT NULL,
+    WINS INTEGER NOT NULL,
+    PRIMARY KEY(HANDLE, GAMEMODE, PATCH)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS PlayerTowerStats
+(
+    HANDLE TEXT NOT NULL,
+    PATCH TEXT NOT NULL,
+    TOWER_TYPE_ID INTEGER NOT NULL,
+    WAVE INTEGER NOT NULL,
+    TOWERS INTEGER NOT NULL,
+    PRIMARY KEY(HANDLE, PATCH, TOWER_TYPE_ID, WAVE),
+    FOREIGN KEY(TOWER_TYPE_ID) REFERENCES TowerTypes(ID)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS PlayerSendStats
+(
+    HANDLE TEXT NOT NULL,
+    PATCH TEXT NOT NULL,
+    SEND_TYPE_ID INTEGER NOT NULL,
+    SENDS INTEGER NOT NULL,
+    PRIMARY KEY(HANDLE, PATCH, SEND_TYPE_ID),
+    FOREIGN KEY(SEND_TYPE_ID) REFERENCES SendTypes(ID)
+) WITHOUT ROWID;
+
+-- Average wave of the nth worker or upgrade is WAVE_SUM / GAMES.
+CREATE TABLE IF NOT EXISTS PlayerWorkerStats
+(
+    HANDLE TEXT NOT NULL,
+    PATCH TEXT NOT NULL,
+    WORKER_NUMBER INTEGER NOT NULL,
+    GAMES INTEGER NOT NULL,
+    WAVE_SUM INTEGER NOT NULL,
+    PRIMARY KEY(HANDLE, PATCH, WORKER_NUMBER)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS PlayerUpgradeStats
+(
+    HANDLE TEXT NOT NULL,
+    PATCH TEXT NOT NULL,
+    UPGRADE_NUMBER INTEGER NOT NULL,
+    GAMES INTEGER NOT NULL,
+    WAVE_SUM INTEGER NOT NULL,
+    PRIMARY KEY(HANDLE, PATCH, UPGRADE_NUMBER)
+) WITHOUT ROWID;
+
+-- Tower meta by patch reads across every handle.
+CREATE INDEX IF NOT EXISTS PlayerTowerStatsPatch ON PlayerTowerStats (PATCH, TOWER_TYPE_ID, TOWERS);
@@ -0,0 +1,55 @@
+import collections, typing
+
+
+# Screening stages, cheapest first, with the MPQ member each one decompresses.
+# A replay rejected at one stage never has later members read, nor its tracker events.
+STAGES = (
+    ("metadata", "replay.gamemetadata.json"),
+    ("attributes", "replay.attributes.events"),
+    ("details", "replay.details"),
+    ("game events", "replay.game.events"),
+)
+# Every member a full read() decompresses.
+MEMBERS = tuple(member for _, member in STAGES) + ("replay.initData", "replay.tracker.events")
+
+# Stages for rejections outside screening: the archive itself, and the full tracker pass.
+MPQ = "mpq"
+TRACKER = "tracker events"
+
+
+class Rejection(typing.NamedTuple):
+    stage: str
+    reason: str
+    # Uncompressed bytes of the MPQ members that were never read.
+    saved: int
+
+
+class RejectionHistogram:
+    """Counts rejected replays by stage and reason, with the bytes screening left unread."""
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.saved = collections.Counter()
+
+    def add(self, rejection: typing.Optional[Rejection]):
+        if rejection is None:
+            return
+        key = (rejection.stage, rejection.reason)
+        self.counts[key] += 1
+        self.saved[key] += rejection.saved
+
+    def rows(self) -> typing.List[tuple]:
+        """(stage, reason, replays, saved bytes), in stage order."""
+        order = [MPQ] + [name for name, _ in STAGES] + [TRACKER]
+        keys = sorted(self.counts, key=lambda k: (order.index(k[0]) if k[0] in order else len(order), k[1]))
+        return [(stage, reason, self.counts[stage, reason], self.saved[stage, reason]) for stage, reason in keys]
+
+    def print_summary(self):
+        rows = self.rows()
+        if not rows:
+            return
+        print(f"\n{sum(self.counts.values())} replays rejected, "
+              f"{sum(self.saved.values()) / (1 << 20):.1f} MiB left undecompressed by screening")
+        print(f"{'stage':<16}{'reason':<40}{'replays':>10}{'saved MiB':>12}")
+        for stage, reason, replays, saved in rows:
+            print(f"{stage:<16}{reason:<40}{replays:>10}{saved / (1 << 20):>12.1f}")
@@ -0,0 +1,99 @@
+"""
+Local HTTP/JSON service over query.Stats, for the stats front end.
+
+    python serve.py --db squadron.db --port 8000
+
+    GET /players/<handle>
+    GET /players/<handle>/matches?limit=20&before=<game id>
+    GET /towers?patch=8.14
+    GET /leaderboard?patch=8.14&gamemode=Chaos&min_games=10&limit=50
+"""
+import argparse, json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from query import Stats
+
+
+def _jsonable(value):
+    if isinstance(value, tuple) and hasattr(value, "_asdict"):
+        return {k: _jsonable(v) for k, v in value._asdict().items()}
+    if isinstance(value, list):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+class StatsHandler(BaseHTTPRequestHandler):
+    stats: Stats = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.strip("/").split("/") if part]
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            found, result = self.route(parts, params)
+        except ValueError as e:
+            return self.send_json(400, {"error": str(e)})
+        if not found:
+            return self.send_json(404, {"error": "Not found"})
+        self.send_json(200, _jsonable(result))
+
+    def route(self, parts: list, params: dict):
+        """Returns (found, result)."""
+        if len(parts) == 2 and parts[0] == "players":
+            profile = self.stats.player_profile(parts[1])
+            return profile is not None, profile
+        if len(parts) == 3 and parts[0] == "players" and parts[2] == "matches":
+            before = params.get("before")
+            return True, self.stats.match_history(parts[1], int(params.get("limit", 20)),
+                                                  int(before) if before is not None else None)
+        if parts == ["towers"] and "patch" in params:
+            return True, self.stats.tower_meta(params["patch"])
+        if parts == ["leaderboard"]:
+            return True, self.stats.leaderboard(params.get("patch"), params.get("gamemode"),
+                                                int(params.get("min_games", 10)), int(params.get("limit", 50)))
+        return False, None
+
+    def send_json(self, status: int, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(stats: Stats, host="127.0.0.1", port=8000) -> ThreadingHTTPServer:
+    handler = type("BoundStatsHandler", (StatsHandler,), {"stats": stats})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve player stats from a Squadron TD database as JSON.")
+    parser.add_argument("--db", metavar="path", type=str, default="./squadron.db", help="Database to read.")
+    parser.add_argument("--host", metavar="h", type=str, default="127.0.0.1")
+    parser.add_argument("--port", metavar="n", type=int, default=8000)
+    parser.add_argument("--connections", metavar="n", type=int, default=8,
+                        help="Number of read-only database connections.")
+    parser.add_argument("--cache-ttl", metavar="s", type=float, default=30.0,
+                        help="Seconds a cached result may be served for.")
+    args = parser.parse_args()
+
+    with Stats(args.db, args.connections, ttl=args.cache_ttl) as stats:
+        server = make_server(stats, args.host, args.port)
+        print(f"Serving {args.db} on http://{args.host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import mmap, os
+
+
+class BufferReader:
+    """
+    The read/seek/tell subset of a binary file that mpyq uses, over a buffer
+    already in memory (bytes, bytearray, memoryview). Only the ranges mpyq
+    reads are copied out; the buffer itself is never copied.
+    """
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast('B')
+        self._pos = 0
+
+    def read(self, size=-1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), self._pos + size)
+        data = self._view[self._pos:end].tobytes()
+        self._pos = max(self._pos, end)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        self._view.release()
+
+
+def is_buffer(source) -> bool:
+    return isinstance(source, (bytes, bytearray, memoryview, mmap.mmap))
+
+
+def map_file(path) -> mmap.mmap:
+    """Maps a replay file read-only. MPQ reads then copy from the page cache instead of issuing a read() each."""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
@@ -1,9 +1,18 @@
-import mpyq, json, os, sys, glob, re, urllib.request, sqlite3, argparse, platform
-from s2protocol import versions
-from event import Event
-from tracker import TrackedUnits
+import mpyq, json, os, re, mmap, hashlib, argparse, platform, functools, itertools, typing
+from event import Event, EventStream, EVENT_KINDS, UNIT_INIT, UNIT_BORN, UNIT_DIED, UPGRADE_EVENT, PLAYER_SETUP
+from tracker import TrackedUnits, TrackedUnit, TowerIndex
+from ingest_index import STATUS_OK, STATUS_DUPLICATE, file_hash
+from cache import SummaryCache, KINDS as SUMMARY_KINDS
+from export import EXPORT_BATCH, ParquetExporter, export_games
+from memory import peak_rss, reset_peak_rss
+from profiler import Profiler, NULL_PROFILER
+from protocols import PROTOCOLS
+from records import GameRecord
+from screen import MEMBERS, MPQ, TRACKER, Rejection, RejectionHistogram
+from source import BufferReader, is_buffer, map_file
+from store import Store
+from watch import ReplayWatcher
 from pathlib import Path
-from tqdm import tqdm
 
 #req = urllib.request.urlopen("https://gist.github.com/Sortiarius/31b6399ec0c9c5a5be46f9c80b9d19a5/raw").read().decode()
 #PATCHES = json.loads(req)
@@ -48,8 +57,17 @@ UNTRACKED_TOWERS = [
     'fSwarmLocust'
 ]
 
-db = sqlite3.connect("./squadron.db")
-c = db.cursor()
+# Replays handed to a worker at a time, and replays a worker parses before it is replaced.
+WORKER_CHUNKSIZE = 4
+WORKER_MAX_TASKS = 200
+# Protocol modules each worker imports at start-up: the builds most common in the ingest index.
+WORKER_WARM_BUILDS = 8
+
+# Watch mode: seconds between polls, and seconds a replay must sit unchanged before it is read.
+WATCH_INTERVAL = 2.0
+WATCH_SETTLE = 3.0
+
+DEFAULT_DB = "./squadron.db"
 
 
 def dump_to_debug(debug: object):
@@ -80,14 +98,6 @@ def patch(timestamp) -> str:
     return min_patch['patch']
 
 
-def closest_version(n, versions) -> (int, int):
-    seq = list(map(int, re.findall('\\d+', ''.join(versions.list_all()))))
-    lst = sorted(seq + [n])
-    min_index = lst.index(n) - 1
-    max_index = min(min_index + 2, len(lst) - 1)
-    return seq[min_index], lst[max_index]
-
-
 def team(tid) -> str:
     if tid == 0:
         return "East"
@@ -95,47 +105,69 @@ def team(tid) -> str:
         return "West"
 
 
-def tower_in_list(list: list, tower: object):
-    for t in list:
-        if t['builder'] == tower['builder'] and \
-                t['type'] == tower['type'] and \
-                t['wave'] == tower['wave'] and \
-                (tower['posx'] == t['posx'] or tower['posx'] - 1 == t['posx'] or tower['posx'] + 1 == t['posx']) and \
-                (tower['posy'] == t['posy'] or tower['posy'] - 1 == t['posy'] or tower['posy'] + 1 == t['posy']):
-            return True
-    return False
+class ReplayError(Exception):
+    """Raised by parse_replay() for a replay that cannot be stored; the message is the reason."""
+
+    def __init__(self, reason: str, game_id=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.game_id = game_id
 
 
 class Replay:
 
-    def __init__(self, path, debug):
+    def __init__(self, path, debug, cache: SummaryCache = None, profiler=None, full_scan=False,
+                 content_hash: str = None):
+        """
+        path is a replay file, or its contents as bytes, a memoryview or an
+        mmap. Files are memory-mapped; close() releases the mapping.
+
+        read() stops decoding tracker events once the winner is known, unless
+        full_scan is set. content_hash is the file's SHA-1 when the caller
+        already has it, as the ingest index does.
+        """
         self.DEBUG = debug
+        self.cache = cache
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+        self.full_scan = full_scan
+        # Game loop of the SecuritySystem death that decided the game, see _until_end().
+        self._end_loop = None
+        self._stopped_early = False
+        self._content_hash = content_hash
+        self._screened = False
+        self._rejection = None
+        # Decompressed MPQ members by name, see _member().
+        self._contents = {}
+        self._buffer = None
+        self._mapped = None
+        self.filename = "<memory>" if is_buffer(path) else path
 
         self.invalid = False
         try:
-            self.archive = mpyq.MPQArchive(path)
+            with self.profiler.stage("mpq"):
+                self.archive = mpyq.MPQArchive(self._open(path), listfile=False)
         except:
             self.invalid = True
+            self.close()
             return
 
         self.archive_contents = self.archive.header['user_data_header']['content']
 
-        _header = versions.latest().decode_replay_header(self.archive_contents)
+        with self.profiler.stage("decode"):
+            _header = PROTOCOLS.latest().decode_replay_header(self.archive_contents)
         self.build = _header['m_version']['m_baseBuild']
+        self.protocol = PROTOCOLS.for_build(self.build)
 
         try:
-            self.protocol = versions.build(self.build)
-        except:
-            next_lower = closest_version(self.build, versions)[0]
-            self.protocol = versions.build(next_lower)
-
-        try:
-            self.meta = json.loads(self.archive.read_file('replay.gamemetadata.json').decode('utf-8'))
+            self.meta = json.loads(self._member('replay.gamemetadata.json').decode('utf-8'))
         except:
             self.invalid = True
             return
 
         self._events = None
+        self._events_source = None
+        self._header_scanned = False
+        self._game_id = None
         self._tracker_events = None
         self._init_data = None
         self._details = None
@@ -147,9 +179,11 @@ class Replay:
         self._phase = "Build"
 
         self.players = []
+        self._players_by_id = {}
 
         self._game = {"wave": 0, "builders": {}}
         self.towers = []
+        self.tower_index = TowerIndex()
         self.towerList = {}
         self.sends = []
         self.buildersByWave = []
@@ -161,52 +195,199 @@ class Replay:
         self.gasNumber = {}
         self.upgradeNumber = {}
 
-        self.filename = path
 
         self._db = None
 
     @property
     def game_events(self):
+        """
+        Lazily decodes the game event stream. Events are decoded on demand and
+        cached in self._events, so iterating again (or stopping early and
+        resuming) never decodes the same event twice.
+        """
         if self._events is None:
-            contents = self.archive.read_file('replay.game.events')
-            for event in self.protocol.decode_replay_game_events(contents):
-                event = Event(**event)
-                yield event
+            contents = self._member('replay.game.events')
+            self._events = []
+            self._events_source = self.profiler.iterate("decode", self.protocol.decode_replay_game_events(contents))
+
+        index = 0
+        while True:
+            if index < len(self._events):
+                yield self._events[index]
+                index += 1
+                continue
 
-        return self._events
+            if self._events_source is None:
+                return
+
+            try:
+                event = Event(next(self._events_source))
+            except StopIteration:
+                self._events_source = None
+                return
+            self._events.append(event)
+
+    def _open(self, source):
+        """A file object for mpyq over the replay's bytes, mapping the file if given a path."""
+        if isinstance(source, mmap.mmap):
+            self._buffer = source
+            return source
+        if is_buffer(source):
+            self._buffer = source
+            return BufferReader(source)
+        self._mapped = self._buffer = map_file(source)
+        return self._mapped
+
+    def close(self):
+        """Releases the file mapping. Members already read stay available."""
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+            self._buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _read(self, name: str) -> bytes:
+        with self.profiler.stage("mpq"):
+            contents = self.archive.read_file(name)
+        self.profiler.add_bytes(len(contents))
+        return contents
+
+    def _member(self, name: str) -> bytes:
+        """Decompresses an MPQ member once and keeps the bytes for later readers."""
+        if name not in self._contents:
+            self._contents[name] = self._read(name)
+        return self._contents[name]
+
+    def _member_size(self, name: str) -> int:
+        """Uncompressed size of an MPQ member from the block table, without reading it."""
+        entry = self.archive.get_hash_table_entry(name)
+        if entry is None:
+            return 0
+        return self.archive.block_table[entry.block_table_index].size
+
+    def _decode_tracker(self, contents: bytes):
+        return self.profiler.iterate("decode", self.protocol.decode_replay_tracker_events(contents), count=True)
 
     @property
-    def tracker_events(self):
+    def tracker_stream(self) -> EventStream:
+        """The shared decode of replay.tracker.events, as raw dicts."""
         if self._tracker_events is None:
-            contents = self.archive.read_file('replay.tracker.events')
-            for event in self.protocol.decode_replay_tracker_events(contents):
-                yield Event(**event)
+            contents = self._member('replay.tracker.events')
+            self._tracker_events = EventStream(
+                functools.partial(self._decode_tracker, contents)
+            )
+        return self._tracker_events
+
+    @property
+    def tracker_events(self):
+        for event in self.tracker_stream:
+            yield Event(event)
+
+    def _tracker_ids(self, kinds) -> set:
+        return {
+            eventid for eventid, (_, name) in self.protocol.tracker_event_types.items()
+            if EVENT_KINDS.get(name) in kinds
+        }
+
+    def tracker_events_of(self, kinds):
+        """
+        Yields only the tracker events whose kind (an event.EVENT_KINDS code)
+        is in kinds. Unwanted events are dropped by their _eventid as soon as
+        the decoder yields them, before any Event is built.
+        """
+        wanted = self._tracker_ids(kinds)
+
+        if self.cache is not None and set(kinds) <= SUMMARY_KINDS:
+            source = self.summary_events()
+        else:
+            source = self.tracker_stream
+
+        for event in self._until_end(source):
+            if event['_eventid'] in wanted:
+                yield Event(event)
+
+    def _until_end(self, events):
+        """
+        Raw events up to the end of the game loop in which read() learned the
+        winner. Stopping here stops the decoder as well, so whatever follows
+        (post-game lobby time, leaver stats) is never decoded.
+        """
+        for event in events:
+            if self._end_loop is not None and event['_gameloop'] > self._end_loop:
+                self._stopped_early = True
+                return
+            yield event
+
+    @property
+    def content_hash(self) -> str:
+        if self._content_hash is None:
+            if self._buffer is not None:
+                self._content_hash = hashlib.sha1(self._buffer).hexdigest()
+            else:
+                self._content_hash = file_hash(self.filename)
+        return self._content_hash
+
+    def summary_events(self):
+        """
+        Raw tracker events of the kinds the summary cache keeps. Served from
+        the cache when it has this replay for the current protocol build,
+        otherwise decoded and written to the cache once fully read.
+        """
+        with self.profiler.stage("cache"):
+            events = self.cache.load(self.content_hash, self.protocol, partial=not self.full_scan)
+        if events is not None:
+            yield from events
+            return
+
+        wanted = self._tracker_ids(SUMMARY_KINDS)
+        events = []
+        for event in self._until_end(self.tracker_stream):
+            if event['_eventid'] in wanted:
+                events.append(event)
+                yield event
+
+        # Stopped at the end of the game: still everything a later read() without full_scan needs.
+        with self.profiler.stage("cache"):
+            self.cache.store(self.content_hash, self.protocol, events, complete=not self._stopped_early)
 
     @property
     def init_data(self):
         if self._init_data is None:
-            contents = self.archive.read_file('replay.initData')
-            self._init_data = self.protocol.decode_replay_initdata(contents)
+            contents = self._member('replay.initData')
+            with self.profiler.stage("decode"):
+                self._init_data = self.protocol.decode_replay_initdata(contents)
         return self._init_data
 
     @property
     def details(self):
         if self._details is None:
-            contents = self.archive.read_file('replay.details')
-            self._details = self.protocol.decode_replay_details(contents)
+            contents = self._member('replay.details')
+            with self.profiler.stage("decode"):
+                self._details = self.protocol.decode_replay_details(contents)
         return self._details
 
     @property
     def game_id(self):
-        for e in self.game_events:
-            if e.get('_event') == 'NNet.Game.SSetSyncLoadingTimeEvent':
-                return e.get('m_syncTime')
+        # Only scans as far as the first SSetSyncLoadingTimeEvent, once.
+        if not self._header_scanned:
+            for e in self.game_events:
+                if e.time_event:
+                    self._game_id = e.get('m_syncTime')
+                    break
+            self._header_scanned = True
+        return self._game_id
 
     @property
     def attribute_events(self):
         if self._attribute_events is None:
-            contents = self.archive.read_file('replay.attributes.events')
-            self._attribute_events = self.protocol.decode_replay_attributes_events(contents)
+            contents = self._member('replay.attributes.events')
+            with self.profiler.stage("decode"):
+                self._attribute_events = self.protocol.decode_replay_attributes_events(contents)
         return self._attribute_events
 
     def game_type(self, mode) -> str:
@@ -236,26 +417,7 @@ class Replay:
 
         return "_INVALID"
 
-    def create_uid_pid_mapping(self):
-        """
-        Make this a bit faster and terminate when we have enough
-        Returns
-        -------
-        """
-        # Set this flag to true when we start hitting the PlayerSetupEvents
-        last_index = None
-        uid_pid_mapping = {}
-        for index, event in enumerate(self.tracker_events):
-            if event.player_setup:
-                last_index = index
-                uid_pid_mapping[event['m_userId']] = event['m_playerId']
-            if last_index is not None and last_index != index:
-                # A new Non Player setup event. We've looped through all.
-                # break out so we don't consume the entire generator.
-                break
-        return uid_pid_mapping
-
-    def load_players(self):
+    def load_players(self, uid_pid_mapping: dict):
         player_container = {}
         team_container = {}
         name_pattern = re.compile(r'&lt;.*<sp/>')
@@ -264,7 +426,6 @@ class Replay:
             e['m_workingSetSlotId']: e['m_userId']
             for e in self.init_data['m_syncLobbyState']['m_lobbyState']['m_slots']
         }
-        uid_pid_mapping = self.create_uid_pid_mapping()
 
         for p in self.details.get('m_playerList', []):
             profile_id = "{m_region}-S2-{m_realm}-{m_id}".format(**p['m_toon'])
@@ -290,11 +451,11 @@ class Replay:
             }
 
             self.players.append(player)
+            # First player wins, as with the old linear scan (observers can share a None player_id).
+            self._players_by_id.setdefault(player_id, player)
 
     def player(self, pid: int) -> any:
-        for player in self.players:
-            if player['player_id'] == pid:
-                return player
+        return self._players_by_id.get(pid)
 
     def handle_upgrade(self, event):
 
@@ -318,22 +479,12 @@ class Replay:
             self.speedUps.append(upgrade)
             self.upgradeNumber[handle] += 1
 
-    def handle_death(self, event: Event, init_event: Event):
-        owner = self.player(init_event['m_controlPlayerId'])
-        killer = self.player(event.get('m_killerPlayerId'))
-        type = init_event.get("m_unitTypeName")
-
+    def handle_death(self, event: Event, unit: TrackedUnit):
         if self._phase == "Fight":
-            self.kills.append(
-                {
-                    "owner": owner,
-                    "killer": killer,
-                    "event": event,
-                    "type": init_event.get("m_unitTypeName")
-                }
-            )
+            # (owner player ID, killer player ID, unit type, game loop)
+            self.kills.append((unit.owner, event.get('m_killerPlayerId'), unit.type, event.get('_gameloop')))
 
-        if init_event.is_unit("SecuritySystem"):
+        if unit.type == "SecuritySystem":
             if event.position == 77:
                 self.winner = "East"
                 self.game_ended = True
@@ -342,6 +493,17 @@ class Replay:
                 self.winner = "West"
                 self.game_ended = True
 
+    def handle_unit_event(self, event: Event):
+        self.tracked_units.add(event)
+        self.handle_unit(event)
+
+    def handle_died_event(self, event: Event):
+        unit = self.tracked_units.fetch(event)
+        if unit is not None:
+            self.handle_death(event, unit)
+            # A unit tag is never reused with the same recycle count, so the dead unit can go.
+            self.tracked_units.delete(event)
+
     def handle_unit(self, event):
         unit_type = event['m_unitTypeName']
 
@@ -405,8 +567,9 @@ class Replay:
                 # if event["m_controlPlayerId"] == 1:
                 # print("Not Found")
                 # if tower not in self.towers:
-                if not tower_in_list(self.towers, tower):
+                if not self.tower_index.near(tower):
                     self.towers.append(tower)
+                    self.tower_index.add(tower)
 
         # Send
         if unit_type[0:5] == "Send_":
@@ -417,56 +580,115 @@ class Replay:
             }
             self.sends.append(send)
 
-    def read(self) -> (bool, any):
+    @property
+    def rejection(self) -> typing.Optional[Rejection]:
+        """Where and why the replay was rejected, once screen() or read() has said so."""
+        if self.invalid:
+            return Rejection(MPQ, "Invalid MPQ", 0)
+        return self._rejection
+
+    def _reject(self, stage: str, reason: str) -> str:
+        # Past screening every member has been read, or served by the cache instead.
+        saved = 0 if stage == TRACKER else sum(self._member_size(name) for name in MEMBERS
+                                               if name not in self._contents)
+        self._rejection = Rejection(stage, reason, saved)
+        return reason
 
+    def screen(self) -> typing.Optional[str]:
+        """
+        Runs the checks that need no tracker events, cheapest first (see
+        screen.STAGES), and returns the reason the replay is rejected, or None.
+        Only the members up to the failing stage are ever decompressed.
+        """
         if self.invalid:
-            return True, "Invalid MPQ"
+            return "Invalid MPQ"
+        if self._screened:
+            return self._rejection.reason if self._rejection else None
+        self._screened = True
 
         if self.meta['Title'] not in ['Squadron TD', 'Squadron TD Beta']:
-            return True, "Unsupported Game"
+            return self._reject("metadata", "Unsupported Game")
 
-        if self.DEBUG:
-            print(f"Parsing game {self.game_id} | {self.filename}")
+        scope = self.attribute_events['scopes'][16]
+        self._gamemode = scope[6][0]['value'].decode()
+        if self._gamemode not in ATTRIBUTES_GAMEMODE:
+            return self._reject("attributes", "Unsupported Gamemode")
+        self._creeps = scope[2][0]['value'].decode()
+        if self._creeps not in ATTRIBUTES_CREEPMULT:
+            return self._reject("attributes", "Unsupported Creep Mode")
+
+        # load_players() keeps one player per details entry.
+        if len(self.details.get('m_playerList', [])) < 4:
+            return self._reject("details", "Not Enough Players")
 
         if patch(self.game_id) == "_INVALID":
-            return True, "Outdated Patch"
+            return self._reject("game events", "Outdated Patch")
 
-        self.load_players()
+        return None
 
-        if len(self.players) < 4:
-            return True, "Not Enough Players"
+    def read(self) -> (bool, any):
+        """Returns (False, GameRecord), or (True, reason) if the replay is rejected."""
+        # Decoding and MPQ reads inside are charged to their own stages.
+        with self.profiler.stage("handle"):
+            return self._parse()
 
-        for player in self.players:
-            self.towerList[player['player_id']] = [[] for i in range(0, 50)]
+    def _parse(self) -> (bool, any):
+
+        reason = self.screen()
+        if reason is not None:
+            return True, reason
 
-        gamemode = self.attribute_events['scopes'][16][6][0]['value'].decode()
-        if gamemode not in ATTRIBUTES_GAMEMODE:
-            return True, "Unsupported Gamemode"
+        if self.DEBUG:
+            print(f"Parsing game {self.game_id} | {self.filename}")
+            reset_peak_rss()
+
+        gamemode, creeps = self._gamemode, self._creeps
         self._game['gamemode'] = ATTRIBUTES_GAMEMODE[gamemode]
 
-        creeps = self.attribute_events['scopes'][16][2][0]['value'].decode()
+        handlers = {
+            UNIT_INIT: self.handle_unit_event,
+            UNIT_BORN: self.handle_unit_event,
+            UPGRADE_EVENT: self.handle_upgrade,
+            UNIT_DIED: self.handle_died_event,
+            # Only the opening block of PlayerSetupEvents is used, see below.
+            PLAYER_SETUP: lambda event: None,
+        }
+        events = self.tracker_events_of(handlers)
+
+        # PlayerSetupEvents open the tracker stream. Collect them from the same pass,
+        # and load the players as soon as the first other event shows up.
+        uid_pid_mapping = {}
+        event = None
+        for event in events:
+            if not event.player_setup:
+                break
+            uid_pid_mapping[event['m_userId']] = event['m_playerId']
+
+        self.load_players(uid_pid_mapping)
 
-        if creeps not in ATTRIBUTES_CREEPMULT:
-            return True, "Unsupported Creep Mode"
+        for player in self.players:
+            self.towerList[player['player_id']] = [[] for i in range(0, 50)]
 
-        for event in self.tracker_events:
+        if event is not None and not event.player_setup:
+            events = itertools.chain((event,), events)
 
-            init_event = self.tracked_units.fetch(event)
+        # Once the SecuritySystem death decides the winner, the rest of its game loop is
+        # still handled (anything at the same moment is part of the end state), then
+        # _until_end() stops the stream.
+        for event in events:
+            handlers[event.kind](event)
+            if self.game_ended and self._end_loop is None and not self.full_scan:
+                self._end_loop = event.get('_gameloop')
 
-            if event.unit_init or event.unit_born:
-                self.tracked_units.add(event)
-                self.handle_unit(event)
-            if event.upgrade_event:
-                self.handle_upgrade(event)
-            if event.unit_died and init_event is not None:
-                self.handle_death(event, init_event)
+        if self._tracker_events is not None:
+            self._tracker_events.close()
 
         if not self.game_ended:
-            return True, "Game did not end or was Cooperative."
+            return True, self._reject(TRACKER, "Game did not end or was Cooperative.")
 
         gamemode = self.game_type(ATTRIBUTES_GAMEMODE[gamemode])
         if gamemode == "_INVALID":
-            return True, "Unable to Parse Gamemode"
+            return True, self._reject(TRACKER, "Unable to Parse Gamemode")
 
         for player in self.players:
             if player['team'] == self.winner:
@@ -490,103 +712,305 @@ class Replay:
 
         #dump_to_debug(self.towers)
 
+        if self.DEBUG:
+            peak = peak_rss()
+            if peak is not None:
+                print(f"Peak RSS {peak / (1 << 20):.1f} MiB | {self.filename}")
+
         self._db = game
 
         return False, game
 
-    def insert(self):
-        game_id = self.game_id
-
-        for row in c.execute("SELECT * FROM Games WHERE id = ?", (game_id,)):
-            if row[0] == game_id:
-                if self.DEBUG:
-                    print(f"Game {game_id} Already Found in Database.")
-                return
+    def insert(self, store: Store):
+        store.insert(self._db)
 
-        c.execute(
-            "INSERT INTO Games(ID, PATCH, CREEPS, GAMEMODE, END) VALUES(?,?,?,?,?)",
-            (self.game_id, patch(self.game_id), self._db['creeps'], self._db['gamemode'], self._db['end_wave'])
-        )
-
-        for player in self._db['players']:
-            add_player = True
-
-            for row in c.execute("SELECT * FROM Players WHERE HANDLE = ?", (player['handle'],)):
-                if row[0] == player['handle']:
-                    add_player = False
-                    if game_id > row[2]:
-                        c.execute(
-                            "UPDATE Players SET NAME = ?, LATEST_GAME = ? WHERE HANDLE = ?",
-                            (player['name'], game_id, player['handle'])
-                        )
-
-            if add_player:
-                c.execute(
-                    "INSERT INTO Players(HANDLE, NAME, LATEST_GAME) VALUES(?,?,?)",
-                    (player['handle'], player['name'], game_id)
-                )
-
-            won = 0
-            if player['won']:
-                won = 1
-
-            c.execute(
-                "INSERT INTO GamePlayers(PLAYER_ID,TEAM,WON,PLAYER_HANDLE,GAME_ID) VALUES(?,?,?,?,?)",
-                (player['player_id'], player['team'], won, player['handle'], game_id)
-            )
-
-        for tower in self.towers:
-            player_handle = self.player(tower['builder'])['handle']
-            c.execute(
-                "INSERT INTO Towers(WAVE, TOWER_TYPE, GAME_ID, HANDLE, PLAYER_ID) VALUES(?,?,?,?,?)",
-                (tower['wave'], tower['type'], game_id, player_handle, tower['builder'])
-            )
-
-        for send in self.sends:
-            player_handle = self.player(send['player'])['handle']
-            c.execute(
-                "INSERT INTO Sends(WAVE, SEND_TYPE, GAME_ID, HANDLE, PLAYER_ID) VALUES(?,?,?,?,?)",
-                (send['wave'], send['type'], game_id, player_handle, send['player'])
-            )
 
-        for builder in self.buildersByWave:
-            player_handle = self.player(builder['player'])['handle']
-            c.execute(
-                "INSERT INTO Builders(WAVE, BUILDER, GAME_ID, HANDLE, PLAYER_ID) VALUES (?,?,?,?,?)",
-                (builder['wave'], builder['type'], game_id, player_handle, builder['player'])
-            )
+def parse_replay(source, cache: SummaryCache = None, debug=False, profiler=None, full_scan=False) -> GameRecord:
+    """
+    Parses a replay file, or the bytes of one, without touching any database.
+    Raises ReplayError if the replay is not a finished Squadron TD game.
+    """
+    with Replay(source, debug, cache, profiler, full_scan) as replay:
+        if replay.invalid:
+            raise ReplayError("Invalid MPQ")
+        _err, data = replay.read()
+    if _err:
+        raise ReplayError(data, replay._game_id)
+    return data
+
+
+def warm_protocols(builds):
+    """Pool initializer: import the protocol modules workers are likely to need."""
+    PROTOCOLS.warm(builds)
+
+
+def parse_file(job) -> (str, bool, any, any, any, Rejection, dict, dict):
+    """
+    Worker entry point for --workers. Parses a single replay and returns only
+    picklable data, including the replay's Rejection if it was rejected. Any
+    exception is reported back as an error instead of being raised, so one
+    corrupt replay cannot take down the pool.
+
+    With profiling on, also returns the replay's profile record and, if it is
+    wanted for the cProfile dump, its stats.
+    """
+    file, debug, cache, dump, full_scan, digest = job
+    if dump is None:
+        return (file,) + _parse_file(file, debug, cache, NULL_PROFILER, full_scan, digest) + (None, None)
+
+    profiler = Profiler(dump)
+    with profiler.replay(file) as record:
+        result = _parse_file(file, debug, cache, profiler, full_scan, digest)
+    return (file,) + result + (record, profiler.profile_stats(record))
+
+
+def _parse_file(file, debug, cache, profiler, full_scan, digest=None) -> (bool, any, any, any, Rejection):
+    replay = None
+    try:
+        with Replay(file, debug, cache, profiler, full_scan, digest) as replay:
+            if replay.invalid:
+                return True, "Invalid MPQ", None, None, replay.rejection
+            _err, data = replay.read()
+        return _err, data, replay._game_id, replay.build, replay.rejection
+    except Exception as e:
+        game_id = replay._game_id if replay is not None and not replay.invalid else None
+        return True, f"{type(e).__name__}: {e}", game_id, getattr(replay, "build", None), None
+
+
+def ingest_file(file, store: Store, debug=False, cache: SummaryCache = None, profiler=NULL_PROFILER,
+                rejections: RejectionHistogram = None, full_scan=False):
+    """
+    Parses and stores one replay. A replay that fails to parse is recorded in
+    the ingest index with the error, as parse_file() reports it, so a bad
+    file neither stops the run nor comes back on the next one.
+    """
+    try:
+        entry = store.index.lookup(file)
+    except OSError as e:
+        # Gone or unreadable since it was listed; there is nothing to index it by.
+        if debug:
+            print(f"Cannot read replay: {file} ({e})".encode('utf-8'))
+        return
+    if entry is None:
+        if debug:
+            print(f"Replay unchanged since last run: {file}")
+        return
+
+    with profiler.replay(file):
+        try:
+            replay = Replay(file, debug, cache, profiler, full_scan, entry.hash)
+        except Exception as e:
+            _record_error(store, entry, file, ReplayError(f"{type(e).__name__}: {e}"), None, debug)
+            return
 
-        for worker in self.workers:
-            player_handle = self.player(worker['player'])['handle']
-            c.execute(
-                "INSERT INTO Workers(WORKER_NUMBER, WORKER_WAVE, GAME_ID, HANDLE, PLAYER_ID) VALUES (?,?,?,?,?)",
-                (worker['number'], worker['wave'], game_id, player_handle, worker['player'])
-            )
+        with replay:
+            try:
+                _ingest_entry(entry, file, replay, store, debug, profiler)
+            except ReplayError as e:
+                _record_error(store, entry, file, e, replay.build, debug)
+        if rejections is not None:
+            rejections.add(replay.rejection)
+
+
+def _record_error(store: Store, entry, file, error: ReplayError, build, debug):
+    if debug:
+        print(f"Invalid Replay: {file} ({error.reason})".encode('utf-8'))
+    store.index.record(entry, error.game_id, error.reason, build)
+
+
+def _ingest_entry(entry, file, replay, store, debug, profiler):
+
+    if replay.invalid:
+        if debug:
+            print(f"Invalid MPQ: {file}".encode('utf-8'))
+        store.index.record(entry, None, "Invalid MPQ")
+        return
+
+    # Screening comes before the duplicate check, which needs the game events.
+    try:
+        reason = replay.screen()
+    except:
+        if debug:
+            print(f"Invalid MPQ Events: {file}".encode('utf-8'))
+        store.index.record(entry, replay._game_id, "Invalid MPQ Events", replay.build)
+        return
+
+    if reason is not None:
+        if debug:
+            print(f"Invalid Replay: {file}".encode('utf-8'))
+        store.index.record(entry, replay._game_id, reason, replay.build)
+        return
+
+    replay_id = replay.game_id
+
+    # Every player's copy of a game has its own file, so check the game itself too.
+    if store.exists(replay_id):
+        if debug:
+            print(f"Replay already in Database: {file}")
+        store.index.record(entry, replay_id, STATUS_DUPLICATE, replay.build)
+        return
+
+    try:
+        _err, data = replay.read()
+    except Exception as e:
+        # Only parsing is guarded: a database error below should still stop the run.
+        raise ReplayError(f"{type(e).__name__}: {e}", replay_id) from e
+    if _err:
+        if debug:
+            print(f"Invalid Replay: {file}".encode('utf-8'))
+        store.index.record(entry, replay_id, data, replay.build)
+        return
+
+    with profiler.stage("write"):
+        store.add(data)
+    store.index.record(entry, replay_id, STATUS_OK, replay.build)
+
+
+def ingest_parallel(files, store: Store, workers: int, debug=False, cache: SummaryCache = None,
+                    profiler=NULL_PROFILER, rejections: RejectionHistogram = None, full_scan=False):
+    import multiprocessing
+    from tqdm import tqdm
+
+    entries = []
+    for file in files:
+        try:
+            entry = store.index.lookup(file)
+        except OSError as e:
+            # Gone or unreadable since it was listed; there is nothing to index it by.
+            if debug:
+                print(f"Cannot read replay: {file} ({e})".encode('utf-8'))
+            continue
+        if entry is not None:
+            entries.append(entry)
+        elif debug:
+            print(f"Replay unchanged since last run: {file}")
+
+    # Workers only parse; this process owns the store and does every insert.
+    # imap keeps results in file order, so runs are deterministic.
+    dump = profiler.dump if profiler.enabled else None
+    jobs = [(entry.path, debug, cache, dump, full_scan, entry.hash) for entry in entries]
+    builds = store.index.common_builds(WORKER_WARM_BUILDS)
+    with multiprocessing.Pool(workers, warm_protocols, (builds,), maxtasksperchild=WORKER_MAX_TASKS) as pool:
+        results = pool.imap(parse_file, jobs, chunksize=WORKER_CHUNKSIZE)
+        for entry, result in tqdm(zip(entries, results), total=len(jobs)):
+            store_result(store, entry, result, debug, profiler, rejections)
+
+
+def store_result(store: Store, entry, result, debug=False, profiler=NULL_PROFILER,
+                 rejections: RejectionHistogram = None) -> bool:
+    """Stores what parse_file() returned for an ingest index entry. Returns True if a new game was added."""
+    file, _err, data, game_id, build, rejection, record, stats = result
+    if rejections is not None:
+        rejections.add(rejection)
+    with profiler.replay(file, record, stats):
+        if _err:
+            if debug:
+                print(f"Invalid Replay: {file} ({data})".encode('utf-8'))
+            store.index.record(entry, game_id, data, build)
+            return False
+
+        with profiler.stage("write"):
+            added = store.add(data)
+        if added:
+            store.index.record(entry, game_id, STATUS_OK, build)
+        else:
+            store.index.record(entry, game_id, STATUS_DUPLICATE, build)
+        return added
 
-        for upgrade in self.speedUps:
-            player_handle = self.player(upgrade['player'])['handle']
-            c.execute(
-                "INSERT INTO Upgrades(UPGRADE_NUMBER, UPGRADE_WAVE, GAME_ID, HANDLE, PLAYER_ID) VALUES (?,?,?,?,?)",
-                (upgrade['number'], upgrade['wave'], game_id, player_handle, upgrade['player'])
-            )
 
-        db.commit()
+def watch(watcher: ReplayWatcher, store: Store, debug=False, cache: SummaryCache = None,
+          profiler=NULL_PROFILER, rejections: RejectionHistogram = None, full_scan=False):
+    """Ingests replays as they appear and commits after every batch, until interrupted."""
+    try:
+        for ready in watcher:
+            for file in ready:
+                ingest_file(file, store, debug, cache, profiler, rejections, full_scan)
+            with profiler.stage("write"):
+                store.flush()
+            if debug:
+                print(f"Ingested {len(ready)} new replay(s).")
+    except KeyboardInterrupt:
+        pass
 
 
 def main():
     parser = argparse.ArgumentParser(description="Squadron TD Game Parser - Processes .SC2Replay files.")
     parser.add_argument('--debug', metavar="d", type=bool, help="Activates Debug Mode.", required=False)
     parser.add_argument("--path", metavar="p", type=str, help="Path to Starcraft 2 Folder", required=False)
+    parser.add_argument("--db", metavar="file", type=str, default=DEFAULT_DB,
+                        help="SQLite database to write games to.", required=False)
+    parser.add_argument("--workers", metavar="n", type=int, default=1,
+                        help="Number of processes used to parse replays.", required=False)
+    parser.add_argument("--commit-interval", metavar="n", type=int, default=100,
+                        help="Number of games written per database transaction.", required=False)
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and ingest new replays as they are saved.", required=False)
+    parser.add_argument("--interval", metavar="s", type=float, default=WATCH_INTERVAL,
+                        help="Seconds between checks for new replays in watch mode.", required=False)
+    parser.add_argument("--cache", metavar="dir", type=str,
+                        help="Directory to cache decoded replay events in.", required=False)
+    parser.add_argument("--cache-size", metavar="mb", type=int, default=1024,
+                        help="Maximum size of the replay cache in megabytes.", required=False)
+    parser.add_argument("--profile", action="store_true",
+                        help="Time each ingest stage and report per-stage percentiles.", required=False)
+    parser.add_argument("--profile-report", metavar="prefix", type=str, default="profile",
+                        help="Write the profile to <prefix>.json and <prefix>.csv.", required=False)
+    parser.add_argument("--profile-dump", metavar="n", type=int, default=0,
+                        help="Also keep cProfile stats for the n slowest replays.", required=False)
+    parser.add_argument("--rebuild-stats", action="store_true",
+                        help="Regenerate the player stats tables from the game tables and exit.", required=False)
+    parser.add_argument("--check-stats", action="store_true",
+                        help="Compare the player stats tables with a full recomputation and exit.", required=False)
+    parser.add_argument("--export", metavar="dir", type=str,
+                        help="Also append newly stored games to a Parquet dataset (needs pyarrow). Games "
+                             "stored before are not included; see --export-stored.", required=False)
+    parser.add_argument("--export-batch", metavar="n", type=int, default=EXPORT_BATCH,
+                        help="Number of games written per set of Parquet files.", required=False)
+    parser.add_argument("--export-stored", action="store_true",
+                        help="Export every game already in the database to the --export dataset and exit.",
+                        required=False)
+    parser.add_argument("--full-scan", action="store_true",
+                        help="Decode every tracker event instead of stopping once the winner is known.",
+                        required=False)
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Ingest through the asyncio pipeline: discovery, --workers decode processes and "
+                             "one writer, joined by bounded queues.", required=False)
+    parser.add_argument("--queue-size", metavar="n", type=int, default=64,
+                        help="Replays each pipeline queue holds before the stage feeding it waits.",
+                        required=False)
 
     args = parser.parse_args()
     DEBUG = False
     if args.debug:
         DEBUG = True
 
-    with open("./schema.sql", "r") as f:
-        schema = f.read()
+    if args.rebuild_stats or args.check_stats:
+        with Store(args.db, debug=DEBUG) as store:
+            if args.rebuild_stats:
+                store.rebuild_stats()
+                print("Rebuilt player stats.")
+            if args.check_stats:
+                mismatches = store.check_stats()
+                for table, rows in mismatches.items():
+                    print(f"{table}: {rows} rows differ from the game tables.")
+                print("Player stats are consistent." if not mismatches else "Run with --rebuild-stats to repair.")
+        return
+
+    exporter = None
+    if args.export:
+        try:
+            exporter = ParquetExporter(args.export, batch_games=args.export_batch)
+        except ImportError as e:
+            print(e)
+            return
 
-    c.executescript(schema)
+    if args.export_stored:
+        if exporter is None:
+            print("--export-stored needs --export.")
+            return
+        with Store(args.db, debug=DEBUG) as store, exporter:
+            print(f"Exported {export_games(store.games(), exporter)} games.")
+        return
 
     if not args.path:
         user = os.path.expanduser("~")
@@ -600,38 +1024,60 @@ def main():
     else:
         file_path = args.path
 
-    total = len(list(Path(file_path).rglob('*.SC2Replay')))
+    if args.pipeline and args.watch:
+        print("--pipeline cannot be combined with --watch.")
+        return
 
-    for file in tqdm(Path(file_path).rglob('*.SC2Replay'), total=total):
-        replay = Replay(file, DEBUG)
+    cache = SummaryCache(args.cache, args.cache_size << 20) if args.cache else None
+    profiler = Profiler(args.profile_dump) if args.profile else NULL_PROFILER
+    rejections = RejectionHistogram()
 
-        if replay.invalid:
-            if DEBUG:
-                print(f"Invalid MPQ: {file}".encode('utf-8'))
-            continue
+    if args.pipeline:
+        import asyncio
+        from pipeline import cancel_on_interrupt, ingest_async
 
-        try:
-            replay_id = replay.game_id
-        except:
-            if DEBUG:
-                print(f"Invalid MPQ Events: {file}".encode('utf-8'))
+        async def ingest():
+            with cancel_on_interrupt(asyncio.current_task()):
+                # The store is opened on the pipeline's writer thread, which is the only one to use it.
+                return await ingest_async(
+                    file_path, lambda: Store(args.db, args.commit_interval, DEBUG, exporter), max(args.workers, 1),
+                    args.queue_size, DEBUG, cache, profiler, rejections, args.full_scan
+                )
+        pipeline = asyncio.run(ingest())
+        pipeline.print_summary()
+    else:
+        store = Store(args.db, args.commit_interval, DEBUG, exporter)
 
-        for row in c.execute("SELECT * FROM Games WHERE ID = ?", (replay_id,)):
-            if row[0] == replay_id:
-                if DEBUG:
-                    print(f"Replay already in Database: {file}")
-                continue
+        if args.watch:
+            watcher = ReplayWatcher(file_path, args.interval, WATCH_SETTLE)
+            files = watcher.prime()
+        else:
+            files = sorted(Path(file_path).rglob('*.SC2Replay'))
 
-        _err, data = replay.read()
-        if _err:
-            if DEBUG:
-                print(f"Invalid Replay: {file}".encode('utf-8'))
-            continue
+        if args.workers > 1:
+            ingest_parallel(files, store, args.workers, DEBUG, cache, profiler, rejections, args.full_scan)
+        else:
+            from tqdm import tqdm
+            for file in tqdm(files):
+                ingest_file(file, store, DEBUG, cache, profiler, rejections, args.full_scan)
+        with profiler.stage("write"):
+            store.flush()
+
+        if args.watch:
+            watch(watcher, store, DEBUG, cache, profiler, rejections, args.full_scan)
+
+        store.close()
 
-        replay.insert()
+    rejections.print_summary()
 
-    db.close()
+    if profiler.enabled:
+        profiler.print_summary()
+        profiler.write(args.profile_report)
+        if args.profile_dump:
+            profiler.dump_profiles(args.profile_report + "-slowest")
 
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
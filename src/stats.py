@@ -0,0 +1,91 @@
+import sqlite3
+from typing import NamedTuple
+
+
+class Aggregate(NamedTuple):
+    table: str
+    keys: tuple
+    sums: tuple
+    # Grouped SELECT over the raw tables; {games} restricts the Games rows it reads.
+    select: str
+
+
+AGGREGATES = (
+    Aggregate("PlayerStats", ("HANDLE", "GAMEMODE", "PATCH"), ("GAMES", "WINS"), """
+        SELECT gp.PLAYER_HANDLE, g.GAMEMODE, g.PATCH, COUNT(*), SUM(gp.WON)
+        FROM Games g JOIN GamePlayers gp ON gp.GAME_ID = g.ID
+        WHERE {games} GROUP BY 1, 2, 3
+    """),
+    Aggregate("PlayerTowerStats", ("HANDLE", "PATCH", "TOWER_TYPE_ID", "WAVE"), ("TOWERS",), """
+        SELECT t.HANDLE, g.PATCH, t.TOWER_TYPE_ID, t.WAVE, COUNT(*)
+        FROM Games g JOIN Towers t ON t.GAME_ID = g.ID
+        WHERE {games} GROUP BY 1, 2, 3, 4
+    """),
+    Aggregate("PlayerSendStats", ("HANDLE", "PATCH", "SEND_TYPE_ID"), ("SENDS",), """
+        SELECT s.HANDLE, g.PATCH, s.SEND_TYPE_ID, COUNT(*)
+        FROM Games g JOIN Sends s ON s.GAME_ID = g.ID
+        WHERE {games} GROUP BY 1, 2, 3
+    """),
+    Aggregate("PlayerWorkerStats", ("HANDLE", "PATCH", "WORKER_NUMBER"), ("GAMES", "WAVE_SUM"), """
+        SELECT w.HANDLE, g.PATCH, w.WORKER_NUMBER, COUNT(*), SUM(w.WORKER_WAVE)
+        FROM Games g JOIN Workers w ON w.GAME_ID = g.ID
+        WHERE {games} GROUP BY 1, 2, 3
+    """),
+    Aggregate("PlayerUpgradeStats", ("HANDLE", "PATCH", "UPGRADE_NUMBER"), ("GAMES", "WAVE_SUM"), """
+        SELECT u.HANDLE, g.PATCH, u.UPGRADE_NUMBER, COUNT(*), SUM(u.UPGRADE_WAVE)
+        FROM Games g JOIN Upgrades u ON u.GAME_ID = g.ID
+        WHERE {games} GROUP BY 1, 2, 3
+    """),
+)
+
+ALL_GAMES = "1"
+NEW_GAMES = "g.ID IN (SELECT ID FROM temp.StatsGames)"
+
+
+def _columns(aggregate: Aggregate) -> str:
+    return ", ".join(aggregate.keys + aggregate.sums)
+
+
+def _upsert(aggregate: Aggregate, games: str) -> str:
+    add = ", ".join(f"{column} = {column} + excluded.{column}" for column in aggregate.sums)
+    return (f"INSERT INTO {aggregate.table}({_columns(aggregate)}) {aggregate.select.format(games=games)} "
+            f"ON CONFLICT({', '.join(aggregate.keys)}) DO UPDATE SET {add}")
+
+
+def update(c: sqlite3.Cursor, game_ids: list):
+    """
+    Adds the games in `game_ids` to the aggregates. Call inside the transaction
+    that inserted their rows, so the aggregates commit or roll back with them.
+    """
+    if not game_ids:
+        return
+    c.execute("CREATE TEMP TABLE IF NOT EXISTS StatsGames(ID INTEGER PRIMARY KEY)")
+    c.executemany("INSERT OR IGNORE INTO temp.StatsGames(ID) VALUES(?)", ((game_id,) for game_id in game_ids))
+    for aggregate in AGGREGATES:
+        c.execute(_upsert(aggregate, NEW_GAMES))
+    c.execute("DELETE FROM temp.StatsGames")
+
+
+def rebuild(db: sqlite3.Connection):
+    """Regenerates every aggregate from the raw tables."""
+    with db:
+        for aggregate in AGGREGATES:
+            db.execute(f"DELETE FROM {aggregate.table}")
+            db.execute(_upsert(aggregate, ALL_GAMES))
+
+
+def check(db: sqlite3.Connection) -> dict:
+    """
+    Compares each aggregate with a full recomputation from the raw tables.
+    Returns {table: number of rows that differ}, empty when they all match.
+    """
+    mismatches = {}
+    for aggregate in AGGREGATES:
+        stored = f"SELECT {_columns(aggregate)} FROM {aggregate.table}"
+        expected = aggregate.select.format(games=ALL_GAMES)
+        differ = 0
+        for query in (f"{stored} EXCEPT {expected}", f"{expected} EXCEPT {stored}"):
+            differ += db.execute(f"SELECT COUNT(*) FROM ({query})").fetchone()[0]
+        if differ:
+            mismatches[aggregate.table] = differ
+    return mismatches
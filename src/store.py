@@ -0,0 +1,121 @@
+import sqlite3, typing
+
+import schema, stats
+from ingest_index import IngestIndex
+from records import GameRecord
+from writer import BulkWriter
+
+
+class Store:
+    """
+    A Squadron TD database: owns its connection, brings the schema up to date
+    when opened, and batches game writes through a BulkWriter. The ingest
+    index shares the connection, so its rows commit with the games.
+
+    With an exporter (see export.ParquetExporter), every newly stored game is
+    also exported. The exporter is flushed on the first commit after its
+    batch fills, and on close, so its files only ever hold committed games.
+
+        with Store("squadron.db") as store:
+            store.add(parse_replay("game.SC2Replay"))
+    """
+
+    def __init__(self, path="squadron.db", commit_interval=100, debug=False, exporter=None):
+        self.path = str(path)
+        self.exporter = exporter
+        self.db = sqlite3.connect(self.path)
+        schema.configure(self.db)
+        schema.upgrade(self.db)
+        self.writer = BulkWriter(self.db, commit_interval, debug)
+        self.index = IngestIndex(self.db)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def exists(self, game_id) -> bool:
+        return self.writer.exists(game_id)
+
+    def add(self, game: GameRecord) -> bool:
+        """Queues a game for the next batch. Returns False if it is already stored."""
+        added = self.writer.add(game)
+        if added and self.exporter is not None:
+            self.exporter.add(game)
+            # The writer commits by itself every commit_interval games.
+            if self.writer.pending == 0:
+                self._export()
+        return added
+
+    def insert(self, game: GameRecord) -> bool:
+        """Writes a game and commits straight away."""
+        added = self.add(game)
+        self.flush()
+        return added
+
+    def flush(self):
+        self.writer.flush()
+        self._export()
+
+    def _export(self):
+        if self.exporter is not None and self.exporter.full:
+            self.exporter.flush()
+
+    def games(self, batch=500) -> typing.Iterator[GameRecord]:
+        """
+        Every stored game rebuilt as a GameRecord, in game ID order. The tables
+        keep neither tower positions nor per-game player names, so posx and
+        posy are None and each player has their latest name.
+        """
+        self.writer.flush()
+        last = -2 ** 63
+        while True:
+            rows = self.db.execute(
+                "SELECT ID, PATCH, CREEPS, GAMEMODE, END FROM Games WHERE ID > ? ORDER BY ID LIMIT ?", (last, batch)
+            ).fetchall()
+            if not rows:
+                return
+            games = {row[0]: GameRecord(id=row[0], patch=row[1], creeps=row[2], gamemode=row[3], end_wave=row[4],
+                                        players=[], towers=[], sends=[], buildersByWave=[], workers=[], upgrades=[])
+                     for row in rows}
+            # The batch is one range of game IDs, so each table is read once through its GAME_ID index.
+            span = (rows[0][0], rows[-1][0])
+            for game_id, player_id, team, won, handle, name in self.db.execute(
+                    "SELECT gp.GAME_ID, gp.PLAYER_ID, gp.TEAM, gp.WON, gp.PLAYER_HANDLE, p.NAME FROM GamePlayers gp "
+                    "JOIN Players p ON p.HANDLE = gp.PLAYER_HANDLE WHERE gp.GAME_ID BETWEEN ? AND ?", span):
+                games[game_id]['players'].append(dict(name=name, handle=handle, user_id=None, player_id=player_id,
+                                                      color=None, team=team, won=bool(won)))
+            for game_id, player_id, kind, wave in self.db.execute(
+                    "SELECT GAME_ID, PLAYER_ID, TOWER_TYPE, WAVE FROM TowersNamed WHERE GAME_ID BETWEEN ? AND ?", span):
+                games[game_id]['towers'].append(dict(builder=player_id, type=kind, wave=wave, posx=None, posy=None))
+            for game_id, player_id, kind, wave in self.db.execute(
+                    "SELECT GAME_ID, PLAYER_ID, SEND_TYPE, WAVE FROM SendsNamed WHERE GAME_ID BETWEEN ? AND ?", span):
+                games[game_id]['sends'].append(dict(player=player_id, type=kind, wave=wave))
+            for game_id, player_id, kind, wave in self.db.execute(
+                    "SELECT GAME_ID, PLAYER_ID, BUILDER, WAVE FROM BuildersNamed WHERE GAME_ID BETWEEN ? AND ?", span):
+                games[game_id]['buildersByWave'].append(dict(player=player_id, type=kind, wave=wave))
+            for table, key in (("Workers", "WORKER"), ("Upgrades", "UPGRADE")):
+                for game_id, player_id, number, wave in self.db.execute(
+                        f"SELECT GAME_ID, PLAYER_ID, {key}_NUMBER, {key}_WAVE FROM {table} "
+                        f"WHERE GAME_ID BETWEEN ? AND ?", span):
+                    games[game_id][table.lower()].append(dict(player=player_id, wave=wave, number=number))
+            yield from games.values()
+            last = rows[-1][0]
+
+    def rebuild_stats(self):
+        self.writer.flush()
+        stats.rebuild(self.db)
+
+    def check_stats(self) -> dict:
+        self.writer.flush()
+        return stats.check(self.db)
+
+    def close(self):
+        if self.db is None:
+            return
+        self.writer.close()
+        if self.exporter is not None:
+            self.exporter.close()
+        self.db.close()
+        self.db = None
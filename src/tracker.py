@@ -2,28 +2,78 @@ from event import Event
 import typing
 
 
+class TrackedUnit(typing.NamedTuple):
+    type: str
+    owner: int
+
+
 class TrackedUnits:
+    """
+    Living units, keyed by their packed SC2 unit tag (index << 18 | recycle).
+    Only the type and owner of each unit are kept, not the whole event.
+    """
+
     def __init__(self):
         self._tracked = {}
 
+    def __len__(self):
+        return len(self._tracked)
+
     def add(self, event: Event) -> None:
-        key = "{m_unitTagIndex}-{m_unitTagRecycle}".format(**event)
-        self._tracked[key] = event
+        self._tracked[(event['m_unitTagIndex'] << 18) | event['m_unitTagRecycle']] = \
+            TrackedUnit(event['m_unitTypeName'], event['m_controlPlayerId'])
 
-    def fetch(self, event: Event, killer=False) -> typing.Optional[Event]:
-        try:
-            if killer:
-                key = "{m_killerUnitTagIndex}-{m_killerUnitTagRecycle}".format(**event)
-            else:
-                key = "{m_unitTagIndex}-{m_unitTagRecycle}".format(**event)
-            return self._tracked.get(key)
-        except KeyError:
+    def fetch(self, event: Event, killer=False) -> typing.Optional[TrackedUnit]:
+        if killer:
+            index, recycle = event.get('m_killerUnitTagIndex'), event.get('m_killerUnitTagRecycle')
+        else:
+            index, recycle = event.get('m_unitTagIndex'), event.get('m_unitTagRecycle')
+        if index is None or recycle is None:
             return
+        return self._tracked.get((index << 18) | recycle)
 
     def delete(self, event: Event) -> None:
-        key = "{m_unitTagIndex}-{m_unitTagRecycle}".format(**event)
+        key = (event['m_unitTagIndex'] << 18) | event['m_unitTagRecycle']
         try:
 
             del self._tracked[key]
         except KeyError:
             print("Tried to delete non-existing key.")
+
+
+def tower_in_list(list: list, tower: object):
+    """Linear reference for TowerIndex.near()."""
+    for t in list:
+        if t['builder'] == tower['builder'] and \
+                t['type'] == tower['type'] and \
+                t['wave'] == tower['wave'] and \
+                (tower['posx'] == t['posx'] or tower['posx'] - 1 == t['posx'] or tower['posx'] + 1 == t['posx']) and \
+                (tower['posy'] == t['posy'] or tower['posy'] - 1 == t['posy'] or tower['posy'] + 1 == t['posy']):
+            return True
+    return False
+
+
+class TowerIndex:
+    """
+    Recorded towers hashed by (builder, type, wave) and grid cell, where a
+    cell is one map unit. A tower counts as already recorded when one of the
+    same builder, type and wave sits in any of the 3x3 cells around it, the
+    same ±1 window tower_in_list() checks, but with nine set lookups instead
+    of a scan over every tower.
+    """
+
+    def __init__(self):
+        self._cells = set()
+
+    def add(self, tower: dict) -> None:
+        self._cells.add((tower['builder'], tower['type'], tower['wave'], tower['posx'], tower['posy']))
+
+    def near(self, tower: dict) -> bool:
+        builder, type, wave = tower['builder'], tower['type'], tower['wave']
+        x, y = tower['posx'], tower['posy']
+        cells = self._cells
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                if (builder, type, wave, x + dx, y + dy) in cells:
+                    return True
+        return False
@@ -0,0 +1,94 @@
+import os, time, typing
+
+
+REPLAY_EXTENSION = ".SC2Replay"
+
+
+class ReplayWatcher:
+    """
+    Polls a Starcraft II folder for newly saved replays without re-walking it.
+
+    The cursor is the mtime of every known directory plus the set of replay
+    paths already seen. A poll stats each known directory and only lists the
+    ones whose mtime moved, which is what happens when a file or folder is
+    added to them. New replays are held back until their size and mtime have
+    stopped changing for `settle` seconds, so files SC2 is still writing are
+    never read half-finished.
+    """
+
+    def __init__(self, root, interval=2.0, settle=3.0):
+        self.root = os.path.abspath(str(root))
+        self.interval = interval
+        self.settle = settle
+
+        self._dirs = {}
+        self._seen = set()
+        self._pending = {}
+
+    def prime(self) -> typing.List[str]:
+        """Walks the folder once and returns every replay already in it, sorted."""
+        files = []
+        for directory, _, names in os.walk(self.root):
+            self._dirs[directory] = os.stat(directory).st_mtime_ns
+            for name in names:
+                if name.endswith(REPLAY_EXTENSION):
+                    path = os.path.join(directory, name)
+                    self._seen.add(path)
+                    files.append(path)
+        files.sort()
+        return files
+
+    def _list(self, directory: str):
+        try:
+            self._dirs[directory] = os.stat(directory).st_mtime_ns
+            entries = list(os.scandir(directory))
+        except OSError:
+            self._dirs.pop(directory, None)
+            return
+
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.path not in self._dirs:
+                    self._list(entry.path)
+            elif entry.name.endswith(REPLAY_EXTENSION) and entry.path not in self._seen:
+                self._pending.setdefault(entry.path, None)
+
+    def poll(self) -> typing.List[str]:
+        """Returns the replays that have finished being written since the last poll."""
+        now = time.time()
+        for directory, mtime in list(self._dirs.items()):
+            try:
+                stat = os.stat(directory)
+            except OSError:
+                del self._dirs[directory]
+                continue
+            # Coarse mtime resolution (FAT, HFS+) can hide a second change in the same tick,
+            # so recently touched folders are listed again until they settle.
+            if stat.st_mtime_ns != mtime or now - stat.st_mtime < self.settle:
+                self._list(directory)
+
+        ready = []
+        for path, last in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current == last and now - stat.st_mtime >= self.settle:
+                del self._pending[path]
+                self._seen.add(path)
+                ready.append(path)
+            else:
+                self._pending[path] = current
+
+        ready.sort()
+        return ready
+
+    def __iter__(self) -> typing.Iterator[typing.List[str]]:
+        while True:
+            ready = self.poll()
+            if ready:
+                yield ready
+            time.sleep(self.interval)
@@ -0,0 +1,238 @@
+import sqlite3
+import stats
+
+
+# Players are keyed by handle; keep the name of the most recent game they appear in.
+UPSERT_PLAYER = """
+    INSERT INTO Players(HANDLE, NAME, LATEST_GAME) VALUES(?,?,?)
+    ON CONFLICT(HANDLE) DO UPDATE SET NAME = excluded.NAME, LATEST_GAME = excluded.LATEST_GAME
+    WHERE excluded.LATEST_GAME > Players.LATEST_GAME
+"""
+
+# Tower, send and builder names are stored once in these tables and referenced by ID.
+TYPE_TABLES = ("TowerTypes", "SendTypes", "BuilderTypes")
+
+
+def type_id(c: sqlite3.Cursor, table: str, name: str) -> int:
+    """Returns the ID of `name` in one of TYPE_TABLES, adding it if needed."""
+    c.execute(f"INSERT OR IGNORE INTO {table}(NAME) VALUES(?)", (name,))
+    return c.execute(f"SELECT ID FROM {table} WHERE NAME = ?", (name,)).fetchone()[0]
+
+
+def insert_game(db: sqlite3.Connection, game: dict, debug=False):
+    """
+    Writes a game dict produced by Replay.read() to the database one row at a
+    time and commits. Kept for single inserts; use BulkWriter for backfills.
+    """
+    c = db.cursor()
+    game_id = game['id']
+
+    for row in c.execute("SELECT * FROM Games WHERE id = ?", (game_id,)):
+        if row[0] == game_id:
+            if debug:
+                print(f"Game {game_id} Already Found in Database.")
+            return
+
+    players = {player['player_id']: player for player in game['players']}
+
+    c.execute(
+        "INSERT INTO Games(ID, PATCH, CREEPS, GAMEMODE, END) VALUES(?,?,?,?,?)",
+        (game_id, game['patch'], game['creeps'], game['gamemode'], game['end_wave'])
+    )
+
+    for player in game['players']:
+        add_player = True
+
+        for row in c.execute("SELECT * FROM Players WHERE HANDLE = ?", (player['handle'],)):
+            if row[0] == player['handle']:
+                add_player = False
+                if game_id > row[2]:
+                    c.execute(
+                        "UPDATE Players SET NAME = ?, LATEST_GAME = ? WHERE HANDLE = ?",
+                        (player['name'], game_id, player['handle'])
+                    )
+
+        if add_player:
+            c.execute(
+                "INSERT INTO Players(HANDLE, NAME, LATEST_GAME) VALUES(?,?,?)",
+                (player['handle'], player['name'], game_id)
+            )
+
+        won = 0
+        if player['won']:
+            won = 1
+
+        c.execute(
+            "INSERT INTO GamePlayers(PLAYER_ID,TEAM,WON,PLAYER_HANDLE,GAME_ID) VALUES(?,?,?,?,?)",
+            (player['player_id'], player['team'], won, player['handle'], game_id)
+        )
+
+    for tower in game['towers']:
+        player_handle = players[tower['builder']]['handle']
+        c.execute(
+            "INSERT INTO Towers(WAVE, TOWER_TYPE_ID, GAME_ID, HANDLE, PLAYER_ID) VALUES(?,?,?,?,?)",
+            (tower['wave'], type_id(c, "TowerTypes", tower['type']), game_id, player_handle, tower['builder'])
+        )
+
+    for send in game['sends']:
+        player_handle = players[send['player']]['handle']
+        c.execute(
+            "INSERT INTO Sends(WAVE, SEND_TYPE_ID, GAME_ID, HANDLE, PLAYER_ID) VALUES(?,?,?,?,?)",
+            (send['wave'], type_id(c, "SendTypes", send['type']), game_id, player_handle, send['player'])
+        )
+
+    for builder in game['buildersByWave']:
+        player_handle = players[builder['player']]['handle']
+        c.execute(
+            "INSERT INTO Builders(WAVE, BUILDER_ID, GAME_ID, HANDLE, PLAYER_ID) VALUES (?,?,?,?,?)",
+            (builder['wave'], type_id(c, "BuilderTypes", builder['type']), game_id, player_handle, builder['player'])
+        )
+
+    for worker in game['workers']:
+        player_handle = players[worker['player']]['handle']
+        c.execute(
+            "INSERT INTO Workers(WORKER_NUMBER, WORKER_WAVE, GAME_ID, HANDLE, PLAYER_ID) VALUES (?,?,?,?,?)",
+            (worker['number'], worker['wave'], game_id, player_handle, worker['player'])
+        )
+
+    for upgrade in game['upgrades']:
+        player_handle = players[upgrade['player']]['handle']
+        c.execute(
+            "INSERT INTO Upgrades(UPGRADE_NUMBER, UPGRADE_WAVE, GAME_ID, HANDLE, PLAYER_ID) VALUES (?,?,?,?,?)",
+            (upgrade['number'], upgrade['wave'], game_id, player_handle, upgrade['player'])
+        )
+
+    stats.update(c, [game_id])
+    db.commit()
+
+
+class BulkWriter:
+    """
+    Buffers the rows of many games and writes them with one executemany per
+    table inside a single transaction. A flush happens every commit_interval
+    games and on close().
+    """
+
+    def __init__(self, db: sqlite3.Connection, commit_interval=100, debug=False):
+        self.db = db
+        self.commit_interval = max(1, commit_interval)
+        self.DEBUG = debug
+
+        self._pending_ids = set()
+        self._games = []
+        self._players = []
+        self._game_players = []
+        self._towers = []
+        self._sends = []
+        self._builders = []
+        self._workers = []
+        self._upgrades = []
+        # name -> ID for each of TYPE_TABLES, filled as names are first written
+        self._type_ids = {table: {} for table in TYPE_TABLES}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def pending(self) -> int:
+        """Games added since the last flush."""
+        return len(self._games)
+
+    def exists(self, game_id) -> bool:
+        if game_id in self._pending_ids:
+            return True
+        return self.db.execute("SELECT 1 FROM Games WHERE ID = ?", (game_id,)).fetchone() is not None
+
+    def add(self, game: dict) -> bool:
+        """Queues a game for writing. Returns False if the game is already stored."""
+        game_id = game['id']
+
+        if self.exists(game_id):
+            if self.DEBUG:
+                print(f"Game {game_id} Already Found in Database.")
+            return False
+
+        # Every row is built before any is queued, so a game that fails here leaves nothing behind.
+        handles = {player['player_id']: player['handle'] for player in game['players']}
+        players = [(player['handle'], player['name'], game_id) for player in game['players']]
+        game_players = [(player['player_id'], player['team'], 1 if player['won'] else 0, player['handle'], game_id)
+                        for player in game['players']]
+        towers = [(t['wave'], t['type'], game_id, handles[t['builder']], t['builder']) for t in game['towers']]
+        sends = [(s['wave'], s['type'], game_id, handles[s['player']], s['player']) for s in game['sends']]
+        builders = [(b['wave'], b['type'], game_id, handles[b['player']], b['player'])
+                    for b in game['buildersByWave']]
+        workers = [(w['number'], w['wave'], game_id, handles[w['player']], w['player']) for w in game['workers']]
+        upgrades = [(u['number'], u['wave'], game_id, handles[u['player']], u['player']) for u in game['upgrades']]
+
+        self._pending_ids.add(game_id)
+        self._games.append((game_id, game['patch'], game['creeps'], game['gamemode'], game['end_wave']))
+        self._players.extend(players)
+        self._game_players.extend(game_players)
+        self._towers.extend(towers)
+        self._sends.extend(sends)
+        self._builders.extend(builders)
+        self._workers.extend(workers)
+        self._upgrades.extend(upgrades)
+
+        if len(self._games) >= self.commit_interval:
+            self.flush()
+        return True
+
+    def _interned(self, c: sqlite3.Cursor, table: str, rows: list) -> list:
+        """Replaces the type name in the second column of `rows` with its ID."""
+        ids = self._type_ids[table]
+        for name in {row[1] for row in rows}.difference(ids):
+            ids[name] = type_id(c, table, name)
+        return [(row[0], ids[row[1]]) + row[2:] for row in rows]
+
+    def flush(self):
+        """Writes every buffered game in one transaction."""
+        try:
+            self._write()
+        except sqlite3.Error:
+            # IDs handed out inside the rolled back transaction are gone.
+            for ids in self._type_ids.values():
+                ids.clear()
+            raise
+
+        self._pending_ids.clear()
+        for rows in (self._games, self._players, self._game_players, self._towers,
+                     self._sends, self._builders, self._workers, self._upgrades):
+            rows.clear()
+
+    def _write(self):
+        with self.db:
+            c = self.db.cursor()
+            c.executemany("INSERT INTO Games(ID, PATCH, CREEPS, GAMEMODE, END) VALUES(?,?,?,?,?)", self._games)
+            c.executemany(UPSERT_PLAYER, self._players)
+            c.executemany(
+                "INSERT INTO GamePlayers(PLAYER_ID,TEAM,WON,PLAYER_HANDLE,GAME_ID) VALUES(?,?,?,?,?)",
+                self._game_players
+            )
+            c.executemany(
+                "INSERT INTO Towers(WAVE, TOWER_TYPE_ID, GAME_ID, HANDLE, PLAYER_ID) VALUES(?,?,?,?,?)",
+                self._interned(c, "TowerTypes", self._towers)
+            )
+            c.executemany(
+                "INSERT INTO Sends(WAVE, SEND_TYPE_ID, GAME_ID, HANDLE, PLAYER_ID) VALUES(?,?,?,?,?)",
+                self._interned(c, "SendTypes", self._sends)
+            )
+            c.executemany(
+                "INSERT INTO Builders(WAVE, BUILDER_ID, GAME_ID, HANDLE, PLAYER_ID) VALUES (?,?,?,?,?)",
+                self._interned(c, "BuilderTypes", self._builders)
+            )
+            c.executemany(
+                "INSERT INTO Workers(WORKER_NUMBER, WORKER_WAVE, GAME_ID, HANDLE, PLAYER_ID) VALUES (?,?,?,?,?)",
+                self._workers
+            )
+            c.executemany(
+                "INSERT INTO Upgrades(UPGRADE_NUMBER, UPGRADE_WAVE, GAME_ID, HANDLE, PLAYER_ID) VALUES (?,?,?,?,?)",
+                self._upgrades
+            )
+            stats.update(c, [game[0] for game in self._games])
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,20 @@
+import os, sys
+
+import pytest
+
+# The modules in src/ import each other by bare name, as when run from that directory.
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, "..", "src")
+sys.path.insert(0, SRC)
+sys.path.insert(0, os.path.join(HERE, "..", "benchmarks"))
+
+import sqreplay
+from synthetic import SyntheticGame, StubProtocol, stubbed
+
+
+@pytest.fixture
+def protocol() -> StubProtocol:
+    """Points sqreplay at a stub archive and protocol decoding one synthetic game, and yields the protocol."""
+    game = SyntheticGame(waves=10, players=8, towers=2, sends=1, workers=0.3, seed=1)
+    with stubbed(sqreplay, game) as protocol:
+        yield protocol
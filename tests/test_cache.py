@@ -0,0 +1,25 @@
+import pickle
+
+import cache
+from cache import SummaryCache
+from synthetic import SyntheticGame, StubProtocol
+
+
+def test_pickled_cache_keeps_its_size_estimate(tmp_path, monkeypatch):
+    game = SyntheticGame(waves=2, players=2, seed=1)
+    protocol = StubProtocol(game)
+    events = [event for event in game.tracker_events() if event['_eventid'] in (1, 2, 5, 6, 9)]
+
+    scans = []
+    evict = SummaryCache._evict
+    monkeypatch.setattr(SummaryCache, "_evict", lambda self: scans.append(1) or evict(self))
+    monkeypatch.setattr(cache, "_shared", {})
+
+    parent = SummaryCache(tmp_path)
+    for n in range(10):
+        # What each worker job gets: a fresh unpickled copy of the parent's cache.
+        worker = pickle.loads(pickle.dumps(parent))
+        worker.store(f"{n:040x}", protocol, events)
+        assert worker.load(f"{n:040x}", protocol) is not None
+
+    assert len(scans) == 1
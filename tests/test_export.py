@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from export import ParquetExporter, dataset, export_games
+from store import Store
+from synthetic import SyntheticGame
+
+HANDLES = [f"1-S2-1-{n}" for n in range(16)]
+
+
+def parquet_files(directory) -> int:
+    return sum(name.endswith(".parquet") for _, _, names in os.walk(directory) for name in names)
+
+
+def test_store_exports_in_batches_not_per_flush(tmp_path):
+    exported = tmp_path / "export"
+    game = SyntheticGame(waves=10, seed=1)
+    with Store(str(tmp_path / "squadron.db"), exporter=ParquetExporter(exported, batch_games=3)) as store:
+        for game_id in range(1, 6):
+            store.add(game.game_dict(game_id, HANDLES))
+            # As watch mode does after every poll.
+            store.flush()
+            if game_id < 3:
+                assert parquet_files(exported) == 0
+        batch = parquet_files(exported)
+        assert batch > 0
+    # The two games left over are written on close.
+    assert parquet_files(exported) == 2 * batch
+    assert dataset(exported, "games").count_rows() == 5
+
+
+def test_export_stored_games(tmp_path):
+    game = SyntheticGame(waves=10, seed=1)
+    records = [game.game_dict(game_id, HANDLES) for game_id in range(1, 8)]
+    with Store(str(tmp_path / "squadron.db")) as store:
+        for record in records:
+            store.add(record)
+        with ParquetExporter(tmp_path / "export", batch_games=4) as exporter:
+            assert export_games(store.games(batch=3), exporter) == len(records)
+
+    stored = {table: dataset(tmp_path / "export", table).to_table() for table in ("games", "towers", "workers")}
+    assert sorted(stored["games"].column("game_id").to_pylist()) == list(range(1, 8))
+    assert stored["towers"].num_rows == sum(len(record['towers']) for record in records)
+    assert sorted(zip(*(stored["workers"].column(c).to_pylist() for c in ("game_id", "handle", "number", "wave")))) \
+        == sorted((r['id'], next(p['handle'] for p in r['players'] if p['player_id'] == w['player']), w['number'],
+                   w['wave']) for r in records for w in r['workers'])
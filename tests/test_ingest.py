@@ -0,0 +1,37 @@
+import sqreplay
+from store import Store
+from synthetic import GAME_ID
+
+
+def test_ingest_file_records_a_replay_that_fails_to_decode(protocol, tmp_path):
+    def truncated(contents):
+        yield from protocol.game.tracker_events()[:20]
+        raise EOFError("tracker stream ends early")
+
+    protocol.decode_replay_tracker_events = truncated
+    replay = tmp_path / "broken.SC2Replay"
+    replay.write_bytes(b"replay")
+
+    with Store(str(tmp_path / "squadron.db")) as store:
+        sqreplay.ingest_file(replay, store)
+        rows = store.db.execute("SELECT GAME_ID, STATUS FROM IngestIndex").fetchall()
+        # Indexed, so the next run (or watch mode after a restart) does not retry it.
+        assert store.index.lookup(replay) is None
+
+    assert rows == [(GAME_ID, "EOFError: tracker stream ends early")]
+
+
+def test_ingest_file_skips_a_replay_that_disappeared(protocol, tmp_path):
+    with Store(str(tmp_path / "squadron.db")) as store:
+        sqreplay.ingest_file(tmp_path / "gone.SC2Replay", store)
+        assert store.db.execute("SELECT COUNT(*) FROM IngestIndex").fetchone()[0] == 0
+
+
+def test_ingest_parallel_skips_a_replay_that_disappeared(protocol, tmp_path):
+    replay = tmp_path / "game.SC2Replay"
+    replay.write_bytes(b"replay")
+
+    with Store(str(tmp_path / "squadron.db")) as store:
+        sqreplay.ingest_parallel([tmp_path / "gone.SC2Replay", replay], store, workers=2)
+        assert store.exists(GAME_ID)
+        assert store.db.execute("SELECT COUNT(*) FROM IngestIndex").fetchone()[0] == 1
@@ -0,0 +1,64 @@
+import asyncio, os, shutil, signal, threading, time
+
+import pipeline
+from store import Store
+from synthetic import GAME_ID
+
+
+def test_pipeline_hashes_off_the_writer_thread(protocol, tmp_path, monkeypatch):
+    hashed = []
+    file_hash = pipeline.file_hash
+    monkeypatch.setattr(pipeline, "file_hash",
+                        lambda path: hashed.append(threading.current_thread().name) or file_hash(path))
+
+    replays = tmp_path / "replays"
+    replays.mkdir()
+    (replays / "game.SC2Replay").write_bytes(b"replay")
+    db = str(tmp_path / "squadron.db")
+
+    def run():
+        return asyncio.run(pipeline.ingest_async(replays, lambda: Store(db), workers=1))
+
+    assert run().added == 1
+    # Unchanged files are skipped before hashing; a copy is hashed and matched to the first.
+    assert run().skipped == 1
+    shutil.copy(replays / "game.SC2Replay", replays / "copy.SC2Replay")
+    again = run()
+    assert (again.added, again.skipped) == (0, 2)
+
+    assert len(hashed) == 2
+    assert not any(name.startswith("pipeline-writer") for name in hashed)
+    with Store(db) as store:
+        assert store.exists(GAME_ID)
+        assert store.db.execute("SELECT COUNT(*) FROM IngestIndex WHERE GAME_ID = ?", (GAME_ID,)).fetchone()[0] == 2
+
+
+def test_repeated_ctrl_c_still_writes_replays_in_flight(protocol, tmp_path):
+    tracker_events = protocol.decode_replay_tracker_events
+
+    def slow(contents):
+        time.sleep(0.5)
+        return tracker_events(contents)
+
+    protocol.decode_replay_tracker_events = slow
+    replays = tmp_path / "replays"
+    replays.mkdir()
+    for n in range(8):
+        (replays / f"game{n}.SC2Replay").write_bytes(b"replay %d" % n)
+    db = str(tmp_path / "squadron.db")
+
+    async def ingest():
+        with pipeline.cancel_on_interrupt(asyncio.current_task()):
+            return await pipeline.ingest_async(replays, lambda: Store(db), workers=2, queue_size=2)
+
+    # Two Ctrl-Cs while the first replays are decoding.
+    for delay in (0.2, 0.3):
+        threading.Timer(delay, os.kill, (os.getpid(), signal.SIGINT)).start()
+    result = asyncio.run(ingest())
+
+    assert result._stopping
+    with Store(db) as store:
+        indexed = store.db.execute("SELECT COUNT(*) FROM IngestIndex").fetchone()[0]
+    # Every replay that reached a worker was written, as duplicates of the one synthetic game.
+    assert 0 < indexed < 8
+    assert result.added == 1 and result.counters["decode"].items == indexed
@@ -0,0 +1,39 @@
+import sqreplay
+from store import Store
+from synthetic import GAME_ID
+
+
+def count_game_event_decodes(protocol) -> list:
+    calls = []
+    decode = protocol.decode_replay_game_events
+    protocol.decode_replay_game_events = lambda contents: calls.append(1) or decode(contents)
+    return calls
+
+
+def test_game_events_are_decoded_once_per_replay(protocol, tmp_path):
+    calls = count_game_event_decodes(protocol)
+    path = tmp_path / "game.SC2Replay"
+    path.write_bytes(b"replay")
+
+    with Store(str(tmp_path / "squadron.db")) as store, sqreplay.Replay(str(path), False) as replay:
+        assert replay.game_id == GAME_ID
+        assert replay.screen() is None
+        _err, game = replay.read()
+        assert not _err
+        replay.insert(store)
+        assert replay.game_id == GAME_ID
+        assert store.exists(GAME_ID)
+
+    assert len(calls) == 1
+
+
+def test_ingest_file_decodes_game_events_once(protocol, tmp_path):
+    calls = count_game_event_decodes(protocol)
+    path = tmp_path / "game.SC2Replay"
+    path.write_bytes(b"replay")
+
+    with Store(str(tmp_path / "squadron.db")) as store:
+        sqreplay.ingest_file(path, store)
+        assert store.exists(GAME_ID)
+
+    assert len(calls) == 1
@@ -0,0 +1,55 @@
+import sqlite3
+
+import schema, stats
+
+
+# The original schema.sql, before PRAGMA user_version: what existing databases are on.
+VERSION_1 = """
+CREATE TABLE Players (HANDLE TEXT PRIMARY KEY NOT NULL, NAME TEXT NOT NULL, LATEST_GAME INTEGER NOT NULL,
+                      UNIQUE(HANDLE));
+CREATE TABLE Games (ID INTEGER PRIMARY KEY NOT NULL, PATCH TEXT NOT NULL, CREEPS TEXT NOT NULL,
+                    GAMEMODE TEXT NOT NULL, END INTEGER NOT NULL, UNIQUE(ID));
+CREATE TABLE GamePlayers (PLAYER_ID INTEGER NOT NULL, TEAM TEXT NOT NULL, WON INTEGER NOT NULL,
+                          PLAYER_HANDLE TEXT NOT NULL, GAME_ID INTEGER NOT NULL);
+CREATE TABLE Towers (WAVE INTEGER NOT NULL, TOWER_TYPE TEXT NOT NULL, GAME_ID INTEGER NOT NULL,
+                     HANDLE TEXT NOT NULL, PLAYER_ID INTEGER NOT NULL);
+CREATE TABLE Sends (WAVE INTEGER NOT NULL, SEND_TYPE TEXT NOT NULL, GAME_ID INTEGER NOT NULL,
+                    HANDLE TEXT NOT NULL, PLAYER_ID INTEGER NOT NULL);
+CREATE TABLE Builders (WAVE INTEGER NOT NULL, BUILDER TEXT NOT NULL, GAME_ID INTEGER NOT NULL,
+                       HANDLE TEXT NOT NULL, PLAYER_ID INTEGER NOT NULL);
+CREATE TABLE Workers (WORKER_NUMBER INTEGER NOT NULL, WORKER_WAVE INTEGER NOT NULL, GAME_ID INTEGER NOT NULL,
+                      HANDLE TEXT NOT NULL, PLAYER_ID INTEGER NOT NULL);
+CREATE TABLE Upgrades (UPGRADE_NUMBER INTEGER NOT NULL, UPGRADE_WAVE INTEGER NOT NULL, GAME_ID INTEGER NOT NULL,
+                       HANDLE TEXT NOT NULL, PLAYER_ID INTEGER NOT NULL);
+
+INSERT INTO Games VALUES (1587249790, '8.14', '1x', 'Chaos', 25);
+INSERT INTO Players VALUES ('1-S2-1-1', 'East', 1587249790), ('1-S2-1-2', 'West', 1587249790);
+INSERT INTO GamePlayers VALUES (1, 'East', 1, '1-S2-1-1', 1587249790), (2, 'West', 0, '1-S2-1-2', 1587249790);
+INSERT INTO Towers VALUES (3, 'fMarine', 1587249790, '1-S2-1-1', 1), (4, 'fTank', 1587249790, '1-S2-1-2', 2);
+INSERT INTO Sends VALUES (5, 'Send_Zergling', 1587249790, '1-S2-1-2', 2);
+INSERT INTO Builders VALUES (0, 'ChaosBuilder', 1587249790, '1-S2-1-1', 1);
+INSERT INTO Workers VALUES (1, 2, 1587249790, '1-S2-1-1', 1);
+INSERT INTO Upgrades VALUES (1, 6, 1587249790, '1-S2-1-2', 2);
+"""
+
+
+def test_upgrade_from_version_1_backfills_stats():
+    db = sqlite3.connect(":memory:")
+    db.executescript(VERSION_1)
+
+    schema.upgrade(db)
+
+    assert schema.version(db) == schema.LATEST_VERSION
+    assert stats.check(db) == {}
+    assert db.execute("SELECT COUNT(*) FROM PlayerStats").fetchone()[0] == 2
+    assert db.execute("SELECT NAME FROM TowerTypes t JOIN Towers ON t.ID = TOWER_TYPE_ID "
+                      "WHERE HANDLE = '1-S2-1-1'").fetchall() == [("fMarine",)]
+
+
+def test_upgrade_fresh_database():
+    db = sqlite3.connect(":memory:")
+
+    schema.upgrade(db)
+
+    assert schema.version(db) == schema.LATEST_VERSION
+    assert stats.check(db) == {}
@@ -0,0 +1,20 @@
+import pytest
+
+from bench_towers import dedupe_indexed, dedupe_linear, tower_stream
+from tracker import TowerIndex, tower_in_list
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_tower_index_keeps_the_same_towers_as_tower_in_list(seed):
+    stream = tower_stream(500, seed)
+    assert dedupe_indexed(stream) == dedupe_linear(stream)
+
+
+def test_tower_index_uses_the_same_window():
+    tower = {"builder": 1, "type": "fMarine", "wave": 2, "posx": 20, "posy": 20}
+    index = TowerIndex()
+    index.add(tower)
+    for dx, dy, other in [(1, 1, {}), (-1, 0, {}), (2, 0, {}), (0.5, 0, {}), (0, 0, {"wave": 3}),
+                          (0, 0, {"builder": 2}), (0, 0, {"type": "fTank"})]:
+        candidate = dict(tower, posx=20 + dx, posy=20 + dy, **other)
+        assert index.near(candidate) == tower_in_list([tower], candidate)
@@ -0,0 +1,41 @@
+import os, sqlite3
+
+import pytest
+
+from conftest import SRC
+from writer import BulkWriter
+
+
+def game(game_id: int) -> dict:
+    players = [{"name": f"Player{pid}", "handle": f"1-S2-1-{pid}", "user_id": pid - 1, "player_id": pid,
+                "color": (0, 0, 0), "team": "East" if pid % 2 else "West", "won": pid % 2 == 1}
+               for pid in range(1, 5)]
+    return {
+        "id": game_id, "patch": "8.14", "creeps": "1x", "gamemode": "Chaos", "end_wave": 10, "players": players,
+        "towers": [{"builder": pid, "type": "fMarine", "wave": 1, "posx": 30, "posy": 20} for pid in range(1, 5)],
+        "sends": [{"player": pid, "type": "Send_Zergling", "wave": 2} for pid in range(1, 5)],
+        "buildersByWave": [{"player": pid, "type": "ChaosBuilder", "wave": 0} for pid in range(1, 5)],
+        "workers": [{"player": pid, "wave": 1, "number": 1} for pid in range(1, 5)],
+        "upgrades": [{"player": pid, "wave": 2, "number": 1} for pid in range(1, 5)],
+    }
+
+
+def test_a_game_that_fails_to_queue_leaves_nothing_behind():
+    db = sqlite3.connect(":memory:")
+    with open(os.path.join(SRC, "schema.sql")) as f:
+        db.executescript(f.read())
+    stored = game(1)
+    # A send by a player the game does not list.
+    broken = dict(stored, sends=stored['sends'] + [{"player": 9, "type": "Send_Zergling", "wave": 1}])
+
+    writer = BulkWriter(db)
+    with pytest.raises(KeyError):
+        writer.add(broken)
+    assert not writer.exists(1)
+    writer.flush()
+    assert db.execute("SELECT COUNT(*) FROM Games").fetchone()[0] == 0
+
+    assert writer.add(stored)
+    writer.close()
+    assert db.execute("SELECT COUNT(*) FROM Games").fetchone()[0] == 1
+    assert db.execute("SELECT COUNT(*) FROM Sends").fetchone()[0] == len(stored['sends'])